@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""Provides :class:`AsyncScreen` and :class:`AsyncWindow`, versions of
+   :class:`screen.Screen` and :class:`screen.Window` that don't block the
+   asyncio event loop when writing to the terminal (Python 3 only).
+
+   Usage::
+
+       scr = await AsyncScreen.open(fg='white', bg='black')
+       w = AsyncWindow(scr, 0, 0, 40, 20)
+       w.write('hello')
+       await scr.drain()
+
+   Output written during one iteration of the event loop is sent as a
+   single frame when the iteration is done.
+"""
+import asyncio
+import os
+import sys
+
+from screen import Screen, Window
+
+
+class AsyncScreen(Screen):
+    """A :class:`screen.Screen` that writes to the terminal through an
+       asyncio :class:`~asyncio.StreamWriter`.
+
+       Writes made during one loop iteration are collected, and sent with
+       one non-blocking write at the start of the next iteration.  Use
+       :meth:`drain` to wait for the terminal to catch up.
+    """
+    def __init__(self, screeninfo=None, writer=None, encoding=None, **kw):
+        super(AsyncScreen, self).__init__(screeninfo, **kw)
+        self.writer = writer
+        self.encoding = encoding or getattr(sys.stdout, 'encoding', None) or 'utf-8'
+        self._pending = []
+        self._scheduled = False
+        self._closed = False  # output is dropped after aclose()
+
+    @classmethod
+    async def open(cls, screeninfo=None, fd=None, **kw):
+        """Create an :class:`AsyncScreen` writing to file descriptor `fd`
+           (a duplicate of stdout's by default).
+
+           The pipe transport makes the file descriptor non-blocking, which
+           is shared with ``sys.stdout`` on most platforms, so don't mix
+           ``print()`` and the async screen.
+        """
+        loop = asyncio.get_running_loop()
+        if fd is None:
+            sys.stdout.flush()
+            fd = os.dup(sys.stdout.fileno())
+        pipe = os.fdopen(fd, 'wb', buffering=0)
+        transport, protocol = await loop.connect_write_pipe(
+            asyncio.streams.FlowControlMixin, pipe
+        )
+        writer = asyncio.StreamWriter(transport, protocol, None, loop)
+        return cls(screeninfo, writer=writer, **kw)
+
+    def _write_out(self, data):
+        if self.writer is None:
+            if not self._closed:
+                super(AsyncScreen, self)._write_out(data)
+            return
+        if self.stats is not None:
+            self.stats.output(data)
+        self._pending.append(data)
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self._send_pending)
+
+    def _flush_out(self):
+        if self.writer is None:
+            if not self._closed:
+                super(AsyncScreen, self)._flush_out()
+        # otherwise the pending output is sent when the loop iteration ends
+
+    def _send_pending(self):
+        self._scheduled = False
+        if self._pending and self.writer is not None:
+            data = ''.join(self._pending)
+            self._pending = []
+            self.writer.write(data.encode(self.encoding, 'replace'))
+
+    async def drain(self):
+        """Send any pending output, and wait until the terminal has accepted
+           enough of it (backpressure).
+        """
+        if self.writer is None:
+            return
+        self._send_pending()
+        await self.writer.drain()
+
+    async def aclose(self):
+        """Reset the colors, send pending output and close the writer.
+           Output written to the screen after this is dropped.
+        """
+        if self.writer is not None:
+            self.close()
+            await self.drain()
+            self.writer.close()
+            self.writer = None
+            self._closed = True
+
+
+class AsyncWindow(Window):
+    """A :class:`screen.Window` on an :class:`AsyncScreen`.
+
+       Writing to the window never blocks, use :meth:`drain` to wait for
+       the terminal.
+    """
+    async def drain(self):
+        """Wait for the screen's output to drain (see
+           :meth:`AsyncScreen.drain`).
+        """
+        await self.screen.drain()
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the output hot paths of :mod:`screen`.
+
+   Every benchmark is run against a null sink (measures the Python side
+   only), and against a real pty (measures the cost of actually writing to
+   a terminal).  For each benchmark we report operations per second, and
+   the bytes and write calls (syscalls, for the pty) per operation, where
+   an operation is one frame of output.
+
+   Usage::
+
+       python bench_screen.py                      # print a table
+       python bench_screen.py --json results.json  # ..and save the results
+
+   (also available as ``inv bench``).
+"""
+from __future__ import print_function, division
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+import screen
+from screen import Screen, ScreenInfo, Window, Renderer
+
+try:
+    timer = time.perf_counter
+except AttributeError:  # pragma: nocover (python 2)
+    timer = time.time
+
+WIDTH, HEIGHT = 200, 50
+
+
+class NullSink(object):
+    """Output stream that only counts what is written to it.
+    """
+    name = 'null'
+
+    def __init__(self):
+        self.writes = self.bytes = 0
+
+    def write(self, data):
+        self.writes += 1
+        self.bytes += len(data)  # the output is (almost always) ascii
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PtySink(NullSink):
+    """Output stream that writes to the slave side of a pty (one
+       ``os.write`` per write call).  A thread reads and discards
+       everything from the master side.
+    """
+    name = 'pty'
+
+    def __init__(self):
+        super(PtySink, self).__init__()
+        import pty
+        self.master, self.slave = pty.openpty()
+        self._reader = threading.Thread(target=self._drain)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _drain(self):
+        try:
+            while os.read(self.master, 65536):
+                pass
+        except OSError:
+            pass
+
+    def write(self, data):
+        data = data.encode('utf-8')
+        self.writes += 1
+        self.bytes += len(data)
+        while data:
+            data = data[os.write(self.slave, data):]
+
+    def close(self):
+        os.close(self.slave)
+        os.close(self.master)
+
+
+def new_screen(sink, **kw):
+    return Screen(ScreenInfo.fixed(WIDTH, HEIGHT), stream=sink,
+                  fg='white', bg='black', **kw)
+
+
+# the benchmarks, each returns a function that performs one operation
+
+def bench_writexy(sink):
+    scr = new_screen(sink)
+    pos = [(x % WIDTH, x % HEIGHT) for x in range(997)]
+    state = {'i': 0}
+
+    def op():
+        i = state['i'] = (state['i'] + 1) % len(pos)
+        x, y = pos[i]
+        scr.writexy(x, y, 'hello world')
+    return op
+
+
+def bench_writexy_color(sink):
+    scr = new_screen(sink)
+    colors = Screen.colors
+
+    def op():
+        for y in range(8):
+            scr.writexy(0, y, 'status', fg=colors[y], bg=colors[7 - y])
+    return op
+
+
+def bench_writemany(sink):
+    scr = new_screen(sink)
+    colors = Screen.colors
+    fields = [((i * 37) % (WIDTH - 8), (i * 11) % HEIGHT, 'field%03d' % i,
+               colors[i % 8], None) for i in range(300)]
+
+    def op():
+        scr.writemany(fields)
+    return op
+
+
+def bench_writelinesxy(sink):
+    scr = new_screen(sink)
+    text = '\n'.join('line %d of the block' % i for i in range(HEIGHT))
+
+    def op():
+        scr.writelinesxy(0, 0, text)
+    return op
+
+
+def bench_fill(sink):
+    scr = new_screen(sink)
+
+    def op():
+        scr.fill(0, 0, WIDTH, HEIGHT, char='.', bg='blue')
+    return op
+
+
+def bench_cls(sink):
+    scr = new_screen(sink)
+
+    def op():
+        scr.cls('blue')
+    return op
+
+
+def bench_color(sink):
+    scr = new_screen(sink)
+
+    def op():
+        scr.color('hello', fg='red', bg='white')
+    return op
+
+
+def bench_frame(sink):
+    scr = new_screen(sink)
+
+    def op():
+        with scr.frame():
+            for y in range(HEIGHT):
+                scr.writexy(0, y, 'row %d' % y, fg='green')
+    return op
+
+
+def bench_present(sink):
+    scr = new_screen(sink, buffered=True)
+    state = {'i': 0}
+
+    def op():
+        # redraw everything, but only a counter changes
+        state['i'] += 1
+        for y in range(HEIGHT):
+            scr.writexy(0, y, 'row %d' % y, fg='green')
+        scr.writexy(WIDTH - 10, 0, str(state['i']))
+        scr.present()
+    return op
+
+
+def bench_window_write(sink):
+    scr = new_screen(sink)
+    w = Window(scr, 10, 5, 60, 20)
+    text = 'a line of text that is long enough to wrap around ' * 3
+
+    def op():
+        w.write(text)
+        w.write('\n')
+    return op
+
+
+def bench_window_scroll(sink):
+    scr = new_screen(sink)
+    w = Window(scr, 0, 5, WIDTH, 20)
+
+    def op():
+        w.write('x' * 40)
+        w.write('\n')
+    return op
+
+
+def _threaded(sink, use_renderer, nthreads=8, lines=200):
+    scr = new_screen(sink)
+    width = WIDTH // nthreads
+    renderer = Renderer(scr, fps=60) if use_renderer else None
+    windows = [
+        renderer.window(i * width, 0, width - 1, HEIGHT) if renderer
+        else Window(scr, i * width, 0, width - 1, HEIGHT)
+        for i in range(nthreads)
+    ]
+
+    def work(w):
+        for i in range(lines):
+            w.write('worker line %d' % i)
+            w.write('\n')
+
+    def op():
+        if renderer:
+            renderer.start()
+        threads = [threading.Thread(target=work, args=(w,)) for w in windows]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if renderer:
+            renderer.stop()
+    return op
+
+
+def bench_threads_lock(sink):
+    return _threaded(sink, use_renderer=False)
+
+
+def bench_threads_renderer(sink):
+    return _threaded(sink, use_renderer=True)
+
+
+BENCHMARKS = [
+    ('writexy', bench_writexy, 20000),
+    ('writexy_color', bench_writexy_color, 5000),
+    ('writemany', bench_writemany, 500),
+    ('writelinesxy', bench_writelinesxy, 2000),
+    ('fill', bench_fill, 500),
+    ('cls', bench_cls, 5000),
+    ('color', bench_color, 50000),
+    ('frame', bench_frame, 2000),
+    ('present', bench_present, 500),
+    ('window_write', bench_window_write, 5000),
+    ('window_scroll', bench_window_scroll, 5000),
+    ('threads_lock', bench_threads_lock, 5),
+    ('threads_renderer', bench_threads_renderer, 5),
+]
+
+SINKS = {'null': NullSink, 'pty': PtySink}
+
+
+def run(names=None, sinks=('null', 'pty'), scale=1.0, repeat=3):
+    """Run the benchmarks, return a list of result dicts.
+    """
+    results = []
+    for sinkname in sinks:
+        for name, factory, number in BENCHMARKS:
+            if names and name not in names:
+                continue
+            number = max(1, int(number * scale))
+            best = None
+            for _ in range(repeat):
+                sink = SINKS[sinkname]()
+                try:
+                    op = factory(sink)
+                    start = timer()
+                    for _ in range(number):
+                        op()
+                    elapsed = timer() - start
+                finally:
+                    sink.close()
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, sink.bytes, sink.writes)
+            elapsed, nbytes, writes = best
+            results.append(dict(
+                name=name,
+                sink=sinkname,
+                ops=number,
+                seconds=elapsed,
+                ops_per_sec=number / elapsed if elapsed else float('inf'),
+                bytes_per_frame=nbytes / number,
+                syscalls_per_frame=writes / number,
+            ))
+    return results
+
+
+def report(results, fp=sys.stdout):
+    print('%-18s %-5s %12s %14s %12s' % (
+        'benchmark', 'sink', 'ops/sec', 'bytes/frame', 'writes/frame'), file=fp)
+    for r in results:
+        print('%-18s %-5s %12.1f %14.1f %12.2f' % (
+            r['name'], r['sink'], r['ops_per_sec'],
+            r['bytes_per_frame'], r['syscalls_per_frame']), file=fp)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('benchmarks', nargs='*', help='benchmarks to run (default: all)')
+    p.add_argument('--json', help='save the results to this file')
+    p.add_argument('--sink', choices=['null', 'pty', 'all'], default='all')
+    p.add_argument('--scale', type=float, default=1.0,
+                   help='multiply the number of operations by this')
+    p.add_argument('--repeat', type=int, default=3,
+                   help='report the best of this many runs')
+    args = p.parse_args(argv)
+
+    sinks = ['null', 'pty'] if args.sink == 'all' else [args.sink]
+    if 'pty' in sinks and sys.platform == 'win32':
+        sinks.remove('pty')
+    results = run(args.benchmarks, sinks, args.scale, args.repeat)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump(dict(
+                python=platform.python_version(),
+                platform=platform.platform(),
+                use_ansi=screen.USE_ANSI,
+                time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                results=results,
+            ), fp, indent=4)
+
+
+if __name__ == '__main__':
+    main()
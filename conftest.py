@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+# test_screen.py and test_window.py are scripts that draw on the terminal,
+# to be inspected visually (python 2), not pytest modules.
+collect_ignore = ['test_screen.py', 'test_window.py']
@@ -9,21 +9,116 @@
 from __future__ import print_function
 import sys
 import os
-import struct
-import pprint
-import threading
-from collections import namedtuple
+import time
+from collections import namedtuple, deque
 from contextlib import contextmanager
+from functools import wraps
 
 try:
-    import colorama
-    colorama.init()
-    USE_ANSI = True
-except ImportError:
-    USE_ANSI = os.environ.get("ConEmuANSI") == "ON" or sys.platform != 'win32'
+    from _thread import RLock as _RLock  # doesn't import threading
+except ImportError:  # pragma: nocover (python 2)
+    from threading import RLock as _RLock
+
+# Importing this module should be cheap and have no side effects.  The
+# windows console is the only place where colorama is needed (to translate
+# ANSI sequences), and there we only wrap the stream Screen writes to,
+# instead of calling colorama.init() which wraps sys.stdout process-wide.
+colorama = None
+USE_ANSI = os.environ.get("ConEmuANSI") == "ON" or sys.platform != 'win32'
+if not USE_ANSI:
+    try:
+        import colorama
+        USE_ANSI = True
+    except ImportError:
+        pass
+
+_wrapped_stdout = (None, None)
+
+
+def _stdout():
+    """Return the stream terminal output goes to by default: the current
+       ``sys.stdout``, wrapped by colorama when the console needs it.
+    """
+    global _wrapped_stdout  # pylint:disable=W0603
+    if colorama is None:
+        return sys.stdout
+    if _wrapped_stdout[0] is not sys.stdout:
+        _wrapped_stdout = (
+            sys.stdout,
+            colorama.AnsiToWin32(sys.stdout).stream
+        )
+    return _wrapped_stdout[1]
 
 
 Position = namedtuple('Position', ['x', 'y'])
+Cell = namedtuple('Cell', ['char', 'fg', 'bg'])
+
+
+class _Memo(dict):
+    """A dict that computes (and remembers) missing values as ``fn(key)``.
+    """
+    def __init__(self, fn, keys=()):
+        super(_Memo, self).__init__()
+        self.fn = fn
+        for key in keys:
+            self[key] = fn(key)
+
+    def __missing__(self, key):
+        val = self[key] = self.fn(key)
+        return val
+
+
+_COLOR_PAIRS = [(fg, bg) for fg in ('',) + tuple(range(30, 38))
+                for bg in ('',) + tuple(range(40, 48))]
+
+#: SGR sequence setting ``(fg, bg)``, e.g. ``_sgr[31, 40] == '\x1b[31;40m'``
+_sgr = _Memo(
+    lambda colors: '\x1b[%sm' % ';'.join(str(c) for c in colors if c),
+    _COLOR_PAIRS
+)
+#: as `_sgr`, but resets all attributes first (``'\x1b[0;31;40m'``)
+_sgr_reset = _Memo(
+    lambda colors: '\x1b[%sm' % ';'.join(['0'] + [str(c) for c in colors if c]),
+    _COLOR_PAIRS
+)
+#: cursor position sequence for zero-based ``(x, y)``
+_cup = _Memo(lambda xy: '\x1b[%d;%dH' % (xy[1] + 1, xy[0] + 1))
+
+#: relative cursor movement (up, down, forward/right, back/left) by `n`
+_cuu = _Memo(lambda n: '\x1b[A' if n == 1 else '\x1b[%dA' % n)
+_cud = _Memo(lambda n: '\x1b[B' if n == 1 else '\x1b[%dB' % n)
+_cuf = _Memo(lambda n: '\x1b[C' if n == 1 else '\x1b[%dC' % n)
+_cub = _Memo(lambda n: '\b' * n if n < 4 else '\x1b[%dD' % n)
+#: erase `n` characters (ECH)
+_ech = _Memo(lambda n: '\x1b[%dX' % n)
+
+_DEFAULT_ATTRS = ('', '')
+
+
+try:
+    _unichr = unichr  # pylint:disable=E0602
+except NameError:
+    _unichr = chr
+
+
+_control_search = []
+
+
+def _has_controls(txt):
+    """Does `txt` contain control characters (that move the cursor)?
+    """
+    if not _control_search:
+        import re
+        _control_search.append(re.compile(u'[\x00-\x1f\x7f]').search)
+    return _control_search[0](txt) is not None
+
+
+def _text(val):
+    """`val` as text (numpy structured arrays can contain bytes).
+    """
+    if isinstance(val, bytes) and not isinstance(val, str):
+        return val.decode('utf-8', 'replace')
+    return str(val)
 
 
 if os.name == 'nt':
@@ -39,6 +134,19 @@ if os.name == 'nt':
 class _Cursor(object):
     # from http://stackoverflow.com/q/5174810
 
+    def __init__(self, screen=None):
+        self.screen = screen
+
+    def _write(self, esc):
+        if self.screen is None:
+            sys.stdout.write(esc)
+            sys.stdout.flush()
+        elif self.screen.in_frame:
+            self.screen._out(esc)
+        else:
+            self.screen._write_out(esc)
+            self.screen._flush_out()
+
     def hide(self):
         """Hide the cursor.
         """
@@ -49,8 +157,7 @@ class _Cursor(object):
             ci.visible = False
             windll.kernel32.SetConsoleCursorInfo(h, byref(ci))
         else:
-            sys.stdout.write("\x1b[?25l")
-            sys.stdout.flush()
+            self._write("\x1b[?25l")
 
     def show(self):
         """Show the cursor.
@@ -62,8 +169,7 @@ class _Cursor(object):
             ci.visible = True
             windll.kernel32.SetConsoleCursorInfo(h, byref(ci))
         else:
-            sys.stdout.write("\x1b[?25h")
-            sys.stdout.flush()
+            self._write("\x1b[?25h")
 
     @contextmanager
     def hidden(self):
@@ -75,8 +181,10 @@ class _Cursor(object):
 
         """
         self.hide()
-        yield
-        self.show()
+        try:
+            yield
+        finally:
+            self.show()
 
 
 cursor = _Cursor()
@@ -84,12 +192,26 @@ cursor = _Cursor()
 
 class ScreenInfo(object):
     """Information about the screen dimensions.
-       Calls SetConsoleMode and GetConsoleScreenBufferInfo on windows,
-       and tries various methods of getting the screen dimension on
+       Calls SetConsoleMode (once) and GetConsoleScreenBufferInfo on
+       windows, and tries various methods of getting the screen dimension on
        non-windows platforms.
+
+       Use :meth:`ScreenInfo.current` to get the process-wide instance that
+       follows the size of the terminal.
     """
+    _current = None
+
+    #: how often (in seconds) to re-read the screen size when there are no
+    #: SIGWINCH signals (windows, or outside the main thread).
+    poll_interval = 0.5
 
     def __init__(self, **kw):
+        self.generation = 0     # incremented when the size changes
+        self._callbacks = []
+        self._watched = False   # True for the process-wide instance
+        self._signals = False   # True if SIGWINCH tells us about resizes
+        self._resized = False
+        self._next_poll = 0
         self.width = kw.get('width', 0)
         self.height = kw.get('height', 0)
         self.x = kw.get('x', 0)
@@ -102,12 +224,92 @@ class ScreenInfo(object):
         self.maxy = kw.get('maxy', 0)
         self.xpos = kw.get('xpos', 0)
         self.ypos = kw.get('ypos', 0)
+        if kw.get('probe', True):
+            if sys.platform == 'win32':
+                self.__set_console_mode_win32()
+            self._probe()
+
+    @classmethod
+    def fixed(cls, columns, lines):
+        """Return screen info for a screen of `columns` x `lines`, without
+           looking at the terminal.
+        """
+        return cls(
+            width=columns - 1, height=lines - 1,
+            right=columns - 1, bottom=lines - 1,
+            maxx=columns - 1, maxy=lines - 1,
+            probe=False
+        )
 
+    def _probe(self):
+        # read the size (this runs on every poll)
         if sys.platform == 'win32':
             self.__set_from_screen_info_win32()
         else:
             self.__set_screen_info_nix()
 
+    @classmethod
+    def current(cls):
+        """Return the (cached) process-wide screen info.  It is kept up to
+           date when the terminal is resized (see :meth:`poll`).
+        """
+        if cls._current is None:
+            info = cls()
+            info._watch()
+            cls._current = info
+        return cls._current
+
+    def _watch(self):
+        self._watched = True
+        try:
+            import signal
+            previous = signal.getsignal(signal.SIGWINCH)
+
+            def on_sigwinch(signum, frame):
+                self._resized = True
+                if callable(previous):
+                    previous(signum, frame)
+
+            signal.signal(signal.SIGWINCH, on_sigwinch)
+            self._signals = True
+        except (AttributeError, ValueError):
+            # no SIGWINCH on windows, and signal handlers can only be
+            # installed from the main thread: fall back to polling.
+            pass
+
+    def on_resize(self, callback):
+        """Call ``callback(screeninfo)`` when the size changes (returns
+           `callback`, so it can be used as a decorator).
+        """
+        self._callbacks.append(callback)
+        return callback
+
+    def poll(self):
+        """Re-read the screen size if it might have changed, i.e. after a
+           SIGWINCH signal, or every :attr:`poll_interval` seconds where
+           there are no signals.  Calls the resize callbacks and returns
+           True if the size changed.
+        """
+        if not self._watched:
+            return False
+        if self._signals:
+            if not self._resized:
+                return False
+            self._resized = False
+        else:
+            now = time.time()
+            if now < self._next_poll:
+                return False
+            self._next_poll = now + self.poll_interval
+        size = self.left, self.top, self.right, self.bottom
+        self._probe()
+        if size == (self.left, self.top, self.right, self.bottom):
+            return False
+        self.generation += 1
+        for callback in list(self._callbacks):
+            callback(self)
+        return True
+
     def __get_screen_size_nix(self):
         """Try various methods of getting the screen size on *nixen.
            From: http://stackoverflow.com/a/566752/75103
@@ -116,7 +318,7 @@ class ScreenInfo(object):
 
         def ioctl_GWINSZ(fd):
             try:
-                import fcntl, termios
+                import fcntl, termios, struct
                 cr = struct.unpack(
                     'hh',
                     fcntl.ioctl(fd, termios.TIOCGWINSZ, '1234')
@@ -144,6 +346,14 @@ class ScreenInfo(object):
         self.right = self.maxx = self.width
         self.bottom = self.maxy = self.height
 
+    def __set_console_mode_win32(self):
+        # Disable line wrapping at bottom of terminal. Having it on means that
+        # anything written to the bottom-most/right-most spot causes the
+        # terminal to wrap -- that is most likely not what you want when
+        # doing absolute cursor positioning.
+        h = windll.kernel32.GetStdHandle(-11)
+        windll.kernel32.SetConsoleMode(h, 1)
+
     def __set_from_screen_info_win32(self):
         """Call windows internals to get dimensions of dosbox.
 
@@ -175,13 +385,7 @@ class ScreenInfo(object):
            } SMALL_RECT;
 
         """
-        # Disable line wrapping at bottom of terminal. Having it on means that
-        # anything written to the bottom-most/right-most spot causes the
-        # terminal to wrap -- that is most likely not what you want when
-        # doing absolute cursor positioning.
-        h = windll.kernel32.GetStdHandle(-11)
-        windll.kernel32.SetConsoleMode(h, 1)
-
+        import struct
         h = windll.kernel32.GetStdHandle(-12)
         csbi = create_string_buffer(22)
         res = windll.kernel32.GetConsoleScreenBufferInfo(h, csbi)
@@ -200,14 +404,408 @@ class ScreenInfo(object):
         self.maxy = vals[10]
 
 
-screen_lock = threading.Lock()
+class _CellGrid(object):
+    """A width x height grid of ``(char, fg, bg)`` cells, used as the
+       back (and front) buffer of a buffered :class:`Screen`.
+       ``fg`` and ``bg`` are SGR codes, or ``''`` for the default color.
+    """
+    blank = (' ', '', '')
+
+    def __init__(self, width, height, cell=blank):
+        self.width = width
+        self.height = height
+        self.rows = [[cell] * width for _ in range(height)]
+
+    def put(self, x, y, txt, fg='', bg=''):
+        """Write `txt` at x, y, clipped to the grid.
+        """
+        if not 0 <= y < self.height or x >= self.width:
+            return
+        if x < 0:
+            txt = txt[-x:]
+            x = 0
+        txt = txt[:self.width - x]
+        self.rows[y][x:x + len(txt)] = [(c, fg, bg) for c in txt]
+
+    def fill(self, x, y, width, height, cell=blank):
+        """Set all cells in the rectangle to `cell`.
+        """
+        x0, x1 = max(x, 0), min(x + width, self.width)
+        if x0 >= x1:
+            return
+        for row in self.rows[max(y, 0):max(y + height, 0)]:
+            row[x0:x1] = [cell] * (x1 - x0)
+
+    def copy(self):
+        """Return a copy of the grid (rows are copied, cells are shared).
+        """
+        res = _CellGrid.__new__(_CellGrid)
+        res.width = self.width
+        res.height = self.height
+        res.rows = [row[:] for row in self.rows]
+        return res
+
+    def resized(self, width, height):
+        """Return a `width` x `height` grid with the cells of this grid
+           that fit.
+        """
+        res = _CellGrid(width, height)
+        for y, row in enumerate(self.rows[:height]):
+            res.rows[y][:len(row)] = row[:width]
+        return res
+
+    def cells(self, y, x0, x1):
+        """The cells x0..x1 of row `y` (None for unknown cells).
+        """
+        return self.rows[y][x0:x1]
+
+    def put_cells(self, x, y, cells):
+        """Set the cells of row `y` starting at column `x` (which must be
+           inside the grid) to `cells`.
+        """
+        self.rows[y][x:x + len(cells)] = cells
+
+    def scroll(self, x, y, width, height, n=1):
+        """Scroll the rectangle up `n` lines, clearing the exposed lines.
+        """
+        x0, x1 = max(x, 0), min(x + width, self.width)
+        y0, y1 = max(y, 0), min(y + height, self.height)
+        rows = self.rows
+        for row in range(y0, y1 - n):
+            rows[row][x0:x1] = rows[row + n][x0:x1]
+        top = max(y1 - n, y0)
+        self.fill(x0, top, x1 - x0, y1 - top)
+
+    def changed_runs(self, front, gap=6):
+        """Yield ``(x, y, cells)`` for each run of cells that differ from
+           `front`.  Runs on the same row that are separated by fewer than
+           `gap` unchanged cells are merged, since re-sending a few cells
+           is cheaper than a new cursor-position sequence.
+        """
+        for y, (row, old) in enumerate(zip(self.rows, front.rows)):
+            if row == old:
+                continue
+            start = end = None
+            for x, cell in enumerate(row):
+                if cell == old[x]:
+                    continue
+                if start is None:
+                    start = x
+                elif x - end > gap:
+                    yield start, y, row[start:end]
+                    start = x
+                end = x + 1
+            if start is not None:
+                yield start, y, row[start:end]
+
+
+# the code points of an _ArrayGrid are in native byte order
+_UTF32 = 'utf-32-le' if sys.byteorder == 'little' else 'utf-32-be'
+
+
+class _ArrayGrid(object):
+    """A :class:`_CellGrid` stored in numpy arrays, for large screens and
+       high frame rates.  Characters are uint32 code points (0 for unknown
+       cells), the colors of a cell are packed in a uint16 (fg << 8 | bg).
+       Finding the changed cells is a vectorized comparison, and fills and
+       scrolls are array slices.
+    """
+    blank = _CellGrid.blank
+
+    def __init__(self, width, height, cell=blank):
+        import numpy
+        self._np = numpy
+        self.width = width
+        self.height = height
+        self.chars = numpy.zeros((height, width), numpy.uint32)
+        self.attrs = numpy.zeros((height, width), numpy.uint16)
+        if cell is not None:
+            self.fill(0, 0, width, height, cell)
+
+    def put(self, x, y, txt, fg='', bg=''):
+        """Write `txt` at x, y, clipped to the grid.
+        """
+        if not 0 <= y < self.height or x >= self.width:
+            return
+        if x < 0:
+            txt = txt[-x:]
+            x = 0
+        txt = txt[:self.width - x]
+        end = x + len(txt)
+        self.chars[y, x:end] = self._np.frombuffer(
+            txt.encode(_UTF32), self._np.uint32
+        )
+        self.attrs[y, x:end] = (fg or 0) << 8 | (bg or 0)
+
+    def fill(self, x, y, width, height, cell=blank):
+        """Set all cells in the rectangle to `cell`.
+        """
+        x0, x1 = max(x, 0), min(x + width, self.width)
+        if x0 >= x1:
+            return
+        rows = slice(max(y, 0), max(y + height, 0))
+        if cell is None:
+            self.chars[rows, x0:x1] = 0
+            self.attrs[rows, x0:x1] = 0
+        else:
+            char, fg, bg = cell
+            self.chars[rows, x0:x1] = ord(char)
+            self.attrs[rows, x0:x1] = (fg or 0) << 8 | (bg or 0)
+
+    def copy(self):
+        """Return a copy of the grid.
+        """
+        res = _ArrayGrid.__new__(_ArrayGrid)
+        res._np = self._np
+        res.width = self.width
+        res.height = self.height
+        res.chars = self.chars.copy()
+        res.attrs = self.attrs.copy()
+        return res
+
+    def resized(self, width, height):
+        """Return a `width` x `height` grid with the cells of this grid
+           that fit.
+        """
+        res = _ArrayGrid(width, height)
+        h, w = min(height, self.height), min(width, self.width)
+        res.chars[:h, :w] = self.chars[:h, :w]
+        res.attrs[:h, :w] = self.attrs[:h, :w]
+        return res
+
+    def cells(self, y, x0, x1):
+        """The cells x0..x1 of row `y` (None for unknown cells).
+        """
+        return self._cells(self.chars[y, x0:x1].tolist(),
+                           self.attrs[y, x0:x1].tolist())
+
+    def put_cells(self, x, y, cells):
+        """Set the cells of row `y` starting at column `x` (which must be
+           inside the grid) to `cells`.
+        """
+        end = x + len(cells)
+        self.chars[y, x:end] = self._np.frombuffer(
+            ''.join(c for c, _, _ in cells).encode(_UTF32), self._np.uint32
+        )
+        self.attrs[y, x:end] = [(fg or 0) << 8 | (bg or 0) for _, fg, bg in cells]
+
+    @staticmethod
+    def _cells(chars, attrs):
+        return [
+            (_unichr(c), a >> 8 or '', a & 0xff or '') if c else None
+            for c, a in zip(chars, attrs)
+        ]
+
+    def scroll(self, x, y, width, height, n=1):
+        """Scroll the rectangle up `n` lines, clearing the exposed lines.
+        """
+        x0, x1 = max(x, 0), min(x + width, self.width)
+        y0, y1 = max(y, 0), min(y + height, self.height)
+        if y1 - n > y0:
+            self.chars[y0:y1 - n, x0:x1] = self.chars[y0 + n:y1, x0:x1]
+            self.attrs[y0:y1 - n, x0:x1] = self.attrs[y0 + n:y1, x0:x1]
+        top = max(y1 - n, y0)
+        self.fill(x0, top, x1 - x0, y1 - top)
+
+    def changed_runs(self, front, gap=6):
+        """Yield ``(x, y, cells)`` for each run of cells that differ from
+           `front` (see :meth:`_CellGrid.changed_runs`).
+        """
+        np = self._np
+        changed = (self.chars != front.chars) | (self.attrs != front.attrs)
+        for y in np.flatnonzero(changed.any(axis=1)).tolist():
+            xs = np.flatnonzero(changed[y])
+            # a new run starts where more than `gap` unchanged cells follow
+            breaks = np.flatnonzero(np.diff(xs) > gap + 1)
+            starts = xs[np.concatenate(([0], breaks + 1))].tolist()
+            ends = (xs[np.concatenate((breaks, [len(xs) - 1]))] + 1).tolist()
+            # the back buffer has no unknown cells
+            text = self.chars[y].tobytes().decode(_UTF32)
+            fgs = (self.attrs[y] >> 8).tolist()
+            bgs = (self.attrs[y] & 0xff).tolist()
+            code = _SGR_CODES.__getitem__
+            for start, end in zip(starts, ends):
+                yield start, y, list(zip(
+                    text[start:end],
+                    map(code, fgs[start:end]),
+                    map(code, bgs[start:end]),
+                ))
+
+
+_SGR_CODES = ('',) + tuple(range(1, 256))  # 0 is the default color
+_GRIDS = {'list': _CellGrid, 'numpy': _ArrayGrid}
+
+screen_lock = _RLock()
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class ScreenStats(object):
+    """Output statistics for a :class:`Screen`, enable them with::
+
+           scr = Screen(stats=True)
+           ...
+           print(scr.stats.summary())
+
+       or by setting the ``SCREEN_STATS`` environment variable, which prints
+       the summary to stderr when the program exits.
+
+       `on_frame` is called as ``on_frame(stats, frame)`` after every
+       output frame, where `frame` is a dict with the ``bytes``, ``writes``
+       and ``seconds`` of that frame.
+    """
+    #: names of the escape sequences, by final character
+    csi_names = dict(
+        H='CUP', f='CUP', A='CUU', B='CUD', C='CUF', D='CUB', m='SGR',
+        K='EL', J='ED', X='ECH', b='REP', r='DECSTBM', s='DECSLRM/SCP',
+        u='RCP', S='SU', T='SD', h='SM', l='RM',
+    )
+    esc_names = {'D': 'IND', 'M': 'RI', '7': 'DECSC', '8': 'DECRC', '\b': 'BS',
+                 '\r': 'CR', '\n': 'LF'}
+    _escapes = None
+
+    def __init__(self, on_frame=None):
+        self.on_frame = on_frame
+        self.reset()
+
+    def reset(self):
+        """Zero all counters.
+        """
+        self.bytes = 0
+        self.writes = 0
+        self.flushes = 0
+        self.frames = 0
+        self.escapes = {}       # escape sequence name -> count
+        self.time = {}          # method name -> seconds
+        self.lock_wait = {}     # window -> seconds spent waiting for the lock
+        self._frame = None
+
+    def output(self, data):
+        """Count `data` that is written to the terminal.
+        """
+        if ScreenStats._escapes is None:
+            import re
+            ScreenStats._escapes = re.compile(
+                r'\x1b\[[?]?[0-9;]*([@-~])|\x1b([^\[])|([\b\r\n])'
+            )
+        self.bytes += len(data)
+        self.writes += 1
+        if self._frame is not None:
+            self._frame['bytes'] += len(data)
+            self._frame['writes'] += 1
+        escapes = self.escapes
+        for csi, esc, ctrl in self._escapes.findall(data):
+            if csi:
+                name = self.csi_names.get(csi, 'CSI ' + csi)
+            else:
+                name = self.esc_names.get(esc or ctrl, 'ESC ' + esc)
+            escapes[name] = escapes.get(name, 0) + 1
+
+    def begin_frame(self):
+        self._frame = dict(bytes=0, writes=0, seconds=_timer())
+
+    def end_frame(self):
+        frame, self._frame = self._frame, None
+        self.frames += 1
+        if frame is not None and self.on_frame is not None:
+            frame['seconds'] = _timer() - frame['seconds']
+            self.on_frame(self, frame)
+
+    def add_time(self, name, seconds):
+        self.time[name] = self.time.get(name, 0.0) + seconds
+
+    def summary(self):
+        """Return a printable summary of the statistics.
+        """
+        lines = [
+            'screen output: %d bytes in %d writes, %d flushes, %d frames' % (
+                self.bytes, self.writes, self.flushes, self.frames),
+        ]
+        if self.escapes:
+            lines.append('escape sequences: ' + ', '.join(
+                '%s=%d' % item for item in sorted(self.escapes.items())))
+        for name, seconds in sorted(self.time.items()):
+            lines.append('time in %s: %.4fs' % (name, seconds))
+        for name, seconds in sorted(self.lock_wait.items()):
+            lines.append('%s waited %.4fs for screen_lock' % (name, seconds))
+        return '\n'.join(lines) + '\n'
+
+
+def _time_methods(obj, names):
+    """Record the time spent in the methods `names` of `obj` in its
+       statistics.  The timing wrappers are only installed on objects
+       that have statistics, the others call their methods directly.
+    """
+    stats = obj.stats
+    for name in names:
+        setattr(obj, name, _timed(getattr(obj, name), name, stats))
+
+
+def _timed(method, name, stats):
+    @wraps(method)
+    def timed(*args, **kw):
+        start = _timer()
+        try:
+            return method(*args, **kw)
+        finally:
+            stats.add_time(name, _timer() - start)
+    return timed
+
+
+class _WindowLock(object):
+    """The screen lock, as seen from a window (records how long the window
+       waited for it when statistics are enabled).
+    """
+    __slots__ = ('window',)
+
+    def __init__(self, window):
+        self.window = window
+
+    def __enter__(self):
+        stats = self.window.screen.stats
+        if stats is None:
+            screen_lock.acquire()
+            return
+        start = _timer()
+        screen_lock.acquire()
+        waited = _timer() - start
+        self.window.lock_wait += waited
+        name = 'Window(%d, %d)' % (self.window.x, self.window.y)
+        stats.lock_wait[name] = stats.lock_wait.get(name, 0.0) + waited
+
+    def __exit__(self, *args):
+        screen_lock.release()
+
+
+class _Line(list):
+    """A mutable line (list of characters) in a :class:`Window`.
+       `wrapped` is True if the text continues on the next line because
+       the line was full (as opposed to a newline).
+    """
+    __slots__ = ('wrapped',)
+
+    def __init__(self, chars=()):
+        super(_Line, self).__init__(chars)
+        self.wrapped = False
 
 
 class Window(object):
     """A window that will scroll text written to it.
        The screen object is thread safe when used through Window objects.
+
+       Lines that scroll off the top of the window are kept in a bounded
+       scrollback history of `scrollback` lines (e.g. 10000), which can
+       be viewed with :meth:`scroll_view`.
+
+       A window created with ``deferred=True`` doesn't paint when it is
+       written to, it only records which parts changed (the dirty spans
+       of each line, scrolling, and clearing).  :meth:`render` paints
+       them, so a burst of output costs only what ends up on the screen.
     """
-    def __init__(self, screen, x, y, width, height):
+    # the methods that are timed when the screen has statistics
+    _timed_methods = ('write', '_paint_content')
+
+    def __init__(self, screen, x, y, width, height, scrollback=0, deferred=False):
         # self.dbg = []
 
         self.screen = screen
@@ -216,46 +814,280 @@ class Window(object):
         self.width = width
         self.height = height
         self.xpos, self.ypos = (0, 0)
-        self.content = ['' for _ in range(self.height)]
+        self.scroll_offset = 0
+        self._painted = None  # the lines shown while scrolled back
+        self._queue = None  # operations waiting for the Renderer
+        self.dropped = 0
+        self._lock = _WindowLock(self)
+        self.lock_wait = 0.0  # seconds spent waiting for screen_lock
+        # deferred painting: {row: (x0, x1)} of the view, the number of
+        # lines scrolled, and (color,) if the window was cleared
+        self._dirty = {} if deferred else None
+        self._scrolled = 0
+        self._clear = None
+        if screen.stats is not None:
+            _time_methods(self, self._timed_methods)
+        # ring buffer of mutable lines (lists of characters), the last
+        # `height` lines are the window, the ones before are scrollback.
+        self._lines = deque(
+            (_Line() for _ in range(self.height)),
+            maxlen=self.height + scrollback
+        )
 
     def __repr__(self):
         t = self.__dict__.copy()
-        del t['content']
+        del t['_lines']
+        del t['_queue']
+        del t['_lock']
         del t['screen']
         # del t['dbg']
         return "screen.Window(%r)" % t
 
+    @property
+    def content(self):
+        """The text of the lines in the window (not including scrollback).
+        """
+        lines = self._lines
+        return [''.join(lines[i]) for i in range(-self.height, 0)]
+
+    @property
+    def deferred(self):
+        """True if the window is only painted by :meth:`render`.
+        """
+        return self._dirty is not None
+
+    @property
+    def history(self):
+        """The number of lines in the scrollback history.
+        """
+        return len(self._lines) - self.height
+
+    def _view(self):
+        """The text of the lines that are currently displayed.
+        """
+        if not self.scroll_offset:
+            return self.content
+        lines = self._lines
+        end = -self.scroll_offset
+        return [''.join(lines[i]) for i in range(end - self.height, end)]
+
+    def scroll_view(self, offset):
+        """Show the window as it was `offset` lines back in the scrollback
+           history (0 shows the live content).  While the view is scrolled
+           back, new output is recorded but not painted.
+        """
+        offset = max(0, min(offset, self.history))
+        # output written while scrolled back can change the lines of the
+        # view (and push them out of a full history), so compare with the
+        # lines that were painted
+        old = self._view() if self._painted is None else self._painted
+        self.scroll_offset = offset
+        view = self._view()
+        self._painted = view if offset else None
+        if view == old:
+            return
+        if self._dirty is not None:
+            self._mark_all()
+        else:
+            self._paint_changed(old)
+
+    @property
+    def stats(self):
+        """The statistics of the screen (or None).
+        """
+        return self.screen.stats
+
+    @contextmanager
+    def frame(self):
+        """Send everything written to the window in the block to the
+           terminal as one write (see :meth:`Screen.frame`).  The screen is
+           locked for the duration of the block.
+        """
+        with self._lock:
+            with self.screen.frame():
+                yield self
+
     def _paint_content(self):
-        self.cls()
-        with screen_lock:
-            self.screen.writelinesxy(
-                self.x, self.y, '\n'.join(self.content)
-            )
+        with self._lock:
+            self.screen._begin_frame()
+            try:
+                self._fill(None)
+                self.screen.writelinesxy(
+                    self.x, self.y, '\n'.join(self._view())
+                )
+            finally:
+                self.screen._end_frame()
+            self._clean()
+
+    def _mark(self, row, x0, x1):
+        """Record that columns x0..x1 of `row` (in the view) need painting.
+        """
+        if x0 < x1:
+            span = self._dirty.get(row)
+            if span is not None:
+                x0, x1 = min(x0, span[0]), max(x1, span[1])
+            self._dirty[row] = (x0, x1)
+
+    def _mark_all(self):
+        self._dirty = {row: (0, self.width) for row in range(self.height)}
+
+    def _mark_scrolled(self, n):
+        """The view scrolled up `n` lines (the dirty rows move with it).
+        """
+        self._scrolled += n
+        self._dirty = {
+            row - n: span for row, span in self._dirty.items() if row >= n
+        }
+
+    def _clean(self):
+        if self._dirty is not None:
+            self._dirty = {}
+        self._scrolled = 0
+        self._clear = None
+
+    def render(self):
+        """Paint what changed since the last call, as one frame (for
+           windows created with ``deferred=True``).  Windows attached to a
+           :class:`Renderer` are rendered by it.
+        """
+        if not (self._dirty or self._scrolled or self._clear):
+            return
+        with self._lock:
+            screen = self.screen
+            screen._begin_frame()
+            try:
+                if self._clear is not None:
+                    self._fill(self._clear[0])
+                n = self._scrolled
+                if n:
+                    if n < self.height and screen.can_scroll(self.x, self.width):
+                        screen.scroll_region(self.x, self.y, self.width, self.height, n)
+                    else:
+                        self._mark_all()
+                view = self._view()
+                for row, (x0, x1) in sorted(self._dirty.items()):
+                    screen.writexy(
+                        self.x + x0, self.y + row, view[row][x0:x1].ljust(x1 - x0)
+                    )
+            finally:
+                screen._end_frame()
+            self._clean()
 
     def _scroll_up(self, n=None):
         if n is None:
             n = self.height // 2
-        self.content = self.content[n:] + [''] * n
-        self._paint_content()
         self.ypos -= n
+        if self.scroll_offset:
+            # keep showing the same history lines
+            self._lines.extend(_Line() for _ in range(n))
+            self.scroll_offset = min(self.scroll_offset + n, self.history)
+            return
+        if self._dirty is not None:
+            self._lines.extend(_Line() for _ in range(n))
+            self._mark_scrolled(n)
+            return
+        old = self.content
+        self._lines.extend(_Line() for _ in range(n))
+        with self._lock:
+            if self.screen.can_scroll(self.x, self.width):
+                # the exposed lines are empty, so there is nothing to draw
+                self.screen.scroll_region(self.x, self.y, self.width, self.height, n)
+            else:
+                self._paint_changed(old)
+
+    def _paint_changed(self, old):
+        """Repaint the lines that differ from the `old` content.
+        """
+        with self._lock:
+            self.screen._begin_frame()
+            try:
+                for i, (line, prev) in enumerate(zip(self._view(), old)):
+                    if line != prev:
+                        self._writexy(0, i, line.ljust(len(prev)))
+            finally:
+                self.screen._end_frame()
 
     def _write(self, txt):
         if self.ypos >= self.height:
             self._scroll_up()
 
-        self.content[self.ypos] = self.content[self.ypos][:self.xpos] + txt
+        self._lines[self.ypos - self.height][self.xpos:] = txt
 
-        self.writexy(self.xpos, self.ypos, txt)
+        if self.scroll_offset:
+            pass
+        elif self._dirty is not None:
+            self._mark(self.ypos, self.xpos, self.xpos + len(txt))
+        else:
+            self._writexy(self.xpos, self.ypos, txt)
         self.xpos += len(txt)
 
+    def resize(self, x, y, width, height):
+        """Move/resize the window, re-wrapping its content (including the
+           scrollback history) to the new width.  The window is not
+           repainted.
+        """
+        with self._lock:
+            lines = list(self._lines)
+            # lines below the writing position are empty
+            cursor = len(lines) - self.height + self.ypos
+            del lines[cursor + 1:]
+            if len(lines) <= cursor:
+                lines.append(_Line())
+
+            wrapped = []
+            text = []
+            for line in lines:
+                text.extend(line)
+                if not line.wrapped or line is lines[-1]:
+                    for pos in range(0, max(len(text), 1), width):
+                        chunk = _Line(text[pos:pos + width])
+                        chunk.wrapped = True
+                        wrapped.append(chunk)
+                    wrapped[-1].wrapped = False
+                    text = []
+
+            # keep the writing position on the same row, if possible
+            row = min(self.ypos, height - 1, len(wrapped) - 1)
+            wrapped.extend(_Line() for _ in range(height - 1 - row))
+            scrollback = self._lines.maxlen - self.height
+            self._lines = deque(wrapped, maxlen=height + scrollback)
+            self.xpos = len(wrapped[-(height - row)])
+            self.ypos = row
+            self.x, self.y, self.width, self.height = x, y, width, height
+            self.scroll_offset = 0
+            self._painted = None
+            self._clean()
+
+    def _enqueue(self, fn, *args):
+        """Queue the call ``fn(*args)`` for the renderer.
+        """
+        queue = self._queue
+        if len(queue) == queue.maxlen:
+            self.dropped += 1
+        queue.append((fn, args))
+
     def newline(self):
+        """Move the writing position to the start of the next line.
+        """
+        if self._queue is not None:
+            return self._enqueue(self._newline)
+        self._newline()
+
+    def _newline(self):
         self.xpos = 0
         self.ypos += 1
 
     def writexy(self, x, y, txt):
         """Write to position x, y relative to the window.
         """
-        with screen_lock:
+        if self._queue is not None:
+            return self._enqueue(self._writexy, x, y, txt)
+        self._writexy(x, y, txt)
+
+    def _writexy(self, x, y, txt):
+        # paint pending changes first, so they don't end up on top
+        self.render()
+        with self._lock:
             self.screen.writexy(
                 self.x + x,
                 self.y + y,
@@ -267,35 +1099,715 @@ class Window(object):
            the contents as needed.
         """
         txt = ' '.join(str(arg) for arg in args)
+        if self._queue is not None:
+            return self._enqueue(self._write_text, txt)
+        self._write_text(txt)
+
+    def _write_text(self, txt):
         if txt == '\n':
-            self.newline()
-        else:
-            while txt:
-                avail_space = self.width - self.xpos
-                try:
-                    nlpos = txt.index('\n')
-                    if nlpos > avail_space:
-                        raise ValueError()
-                    rest_of_line = txt[:nlpos]
-                    txt = txt[nlpos+1:]
-                except ValueError:
-                    rest_of_line = txt[:avail_space]
-                    txt = txt[avail_space:]
-
-                self._write(rest_of_line)
-                if txt:
-                    self.newline()
+            self._newline()
+            return
+        if txt.endswith('\n'):
+            # a single trailing newline is ignored (print writes it separately)
+            txt = txt[:-1]
+        if '\n' not in txt and len(txt) <= self.width - self.xpos:
+            if txt or self.ypos < self.height:
+                self._write(txt)
+            return
+        self._write_lines(txt.split('\n'))
+
+    def _write_lines(self, pieces):
+        """Write `pieces` (the text between newlines), wrapping them at the
+           window width, in one pass.  Only the lines that end up visible
+           are painted, once, at the end.
+        """
+        live = not self.scroll_offset
+        mark = live and self._dirty is not None
+        old = self._view() if live and not mark else None
+        lines = self._lines
+        width, height = self.width, self.height
+        half = height // 2 or 1
+        scrolled = 0
+        for i, piece in enumerate(pieces):
+            if i:
+                self._newline()
+            start, end = 0, width - self.xpos
+            while True:
+                if self.ypos >= height:
+                    lines.extend(_Line() for _ in range(half))
+                    self.ypos -= half
+                    scrolled += half
+                    if mark:
+                        self._mark_scrolled(half)
+                chunk = piece[start:end]
+                lines[self.ypos - height][self.xpos:] = chunk
+                if mark:
+                    self._mark(self.ypos, self.xpos, self.xpos + len(chunk))
+                self.xpos += len(chunk)
+                if end >= len(piece):
+                    break
+                lines[self.ypos - height].wrapped = True
+                self._newline()
+                start, end = end, end + width
+
+        if not live:
+            # keep showing the same history lines
+            self.scroll_offset = min(self.scroll_offset + scrolled, self.history)
+            return
+        if mark:
+            return
+        with self._lock:
+            self.screen._begin_frame()
+            try:
+                if 0 < scrolled < height and self.screen.can_scroll(self.x, width):
+                    self.screen.scroll_region(self.x, self.y, width, height, scrolled)
+                    old = old[scrolled:] + [''] * scrolled
+                self._paint_changed(old)
+            finally:
+                self.screen._end_frame()
+
+    def follow(self, path, encoding='utf-8', bufsize=65536):
+        """Show the end of the file at `path` in the window, like
+           ``tail -f``.  Returns a :class:`Follower`, call its
+           :meth:`~Follower.poll` method periodically to show lines that
+           have been appended to the file.
+        """
+        return Follower(self, path, encoding, bufsize)
 
     def cls(self, color=None):
         """Clear window, fill it with the given color.
         """
+        if self._queue is not None:
+            return self._enqueue(self._cls, color)
+        self._cls(color)
+
+    def _cls(self, color=None):
+        if self._dirty is not None:
+            # the fill covers everything that is pending
+            self._clean()
+            self._clear = (color,)
+            return
+        self._fill(color)
+
+    def _fill(self, color):
         args = {}
         if color:
             args['background'] = color
-        with screen_lock:
+        with self._lock:
             self.screen.fill(self.x, self.y, self.width, self.height, char=' ', **args)
 
 
+class Follower(object):
+    """Follows a (log) file, writing new lines to a :class:`Window` (see
+       :meth:`Window.follow`).
+
+       The end of the file is found by scanning a memory map backwards, and
+       only appended bytes are read after that (into a reused buffer), so
+       the cost doesn't depend on the size of the file.  Truncated files are
+       read again from the start, and when the file is replaced (log
+       rotation) the new file is followed.
+    """
+    def __init__(self, window, path, encoding='utf-8', bufsize=65536):
+        import codecs
+        self.window = window
+        self.path = path
+        self._decoder = codecs.getincrementaldecoder(encoding)('replace')
+        self._buf = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+        self._eol = False  # the last line written ended with a newline
+        # more than this many new bytes can't all be visible, skip to the end
+        self._limit = max(window.width * window.height * 4, bufsize)
+        self._fp = None
+        self._open()
+        self._tail()
+
+    def _open(self):
+        self._fp = open(self.path, 'rb', buffering=0)
+        st = os.fstat(self._fp.fileno())
+        self._ident = (st.st_dev, st.st_ino)
+        self.pos = 0
+
+    def _tail(self):
+        """Show the last `height` lines of the file.
+        """
+        size = os.fstat(self._fp.fileno()).st_size
+        start = end = size
+        if size:
+            import mmap
+            mm = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                lo = max(0, size - self._limit)
+                # a newline at the very end doesn't start a new line
+                nl = end - 1 if mm[end - 1:end] == b'\n' else end
+                for _ in range(self.window.height):
+                    nl = mm.rfind(b'\n', lo, nl)
+                    if nl < 0:
+                        break
+                start = nl + 1 if nl >= 0 else lo
+                data = mm[start:end]
+                if start > self.pos > 0:
+                    self._eol = True  # skipped ahead, start on a new line
+            finally:
+                mm.close()
+            self._decoder.reset()
+            self._show(data)
+        self.pos = end
+        self._fp.seek(end)
+
+    def _show(self, data):
+        text = self._decoder.decode(data).replace('\r', '')
+        if not text:
+            return
+        if self._eol:
+            text = '\n' + text
+        # hold back the final newline so the window doesn't scroll until
+        # there is a next line to show
+        self._eol = text.endswith('\n')
+        if self._eol:
+            text = text[:-1]
+        w = self.window
+        if w._queue is not None:
+            w._enqueue(w._write_lines, text.split('\n'))
+        else:
+            w._write_lines(text.split('\n'))
+
+    def _read(self):
+        """Show everything that was appended to the open file.
+        """
+        fp, view = self._fp, self._view
+        n = fp.readinto(view)
+        while n:
+            self.pos += n
+            self._show(view[:n].tobytes())
+            n = fp.readinto(view)
+
+    def poll(self):
+        """Show the lines appended to the file since the last call.
+        """
+        st = os.fstat(self._fp.fileno())
+        if st.st_size < self.pos:
+            # truncated, start over
+            self._fp.seek(0)
+            self.pos = 0
+            self._decoder.reset()
+        if st.st_size - self.pos > self._limit:
+            self._tail()
+        else:
+            self._read()
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return  # removed, the new file isn't there yet
+        if (st.st_dev, st.st_ino) != self._ident:
+            self._fp.close()
+            self._open()
+            self._decoder.reset()
+            if st.st_size > self._limit:
+                self._tail()
+            else:
+                self._read()
+
+    def close(self):
+        """Stop following the file.
+        """
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Layout(object):
+    """A grid of `xcount` x `ycount` windows covering the screen (see
+       :meth:`Screen.windows`).
+
+       When the terminal is resized the window geometry is recomputed, the
+       windows' content is re-wrapped to the new widths, and the windows
+       whose geometry changed are repainted (in one output frame).
+    """
+    def __init__(self, screen, xcount, ycount, **kw):
+        self.screen = screen
+        self.xcount = xcount
+        self.ycount = ycount
+        geometry = self.geometry()
+        wwidth, wheight = geometry[0][0][2:]
+        assert wwidth > 5 and wheight > 5
+        self.rows = [
+            [Window(screen, *geometry[y][x], **kw) for x in range(xcount)]
+            for y in range(ycount)
+        ]
+        screen.on_resize(self._on_resize)
+
+    @property
+    def windows(self):
+        """All the windows, row by row.
+        """
+        return [w for row in self.rows for w in row]
+
+    def geometry(self):
+        """Return the (x, y, width, height) of each window for the current
+           screen size (as a list of rows).
+        """
+        wwidth = self.screen.width // self.xcount
+        wheight = self.screen.height // self.ycount
+        return [
+            [(x * wwidth, y * wheight, max(wwidth - 1, 1), max(wheight - 1, 1))
+             for x in range(self.xcount)]
+            for y in range(self.ycount)
+        ]
+
+    def _on_resize(self, screen):
+        with screen_lock:
+            for row, geometry in zip(self.rows, self.geometry()):
+                for w, (x, y, width, height) in zip(row, geometry):
+                    if (x, y, width, height) != (w.x, w.y, w.width, w.height):
+                        w.resize(x, y, width, height)
+                        w._paint_content()
+
+    def close(self):
+        """Stop re-fitting the windows when the terminal is resized.
+        """
+        callbacks = self.screen._resize_callbacks
+        if self._on_resize in callbacks:
+            callbacks.remove(self._on_resize)
+
+
+class Renderer(object):
+    """Paints windows from a single render thread.
+
+       Windows attached to the renderer don't touch the screen when they are
+       written to, the operations are put on a per-window queue and the call
+       returns right away.  The render thread drains all queues `fps` times
+       a second and sends everything as one output frame::
+
+           with Renderer(scr, fps=20) as r:
+               w1 = r.window(0, 0, 40, 20)
+               w2 = r.window(40, 0, 40, 20)
+               ...  # worker threads can now write to w1 and w2
+
+       Each window queue holds at most `maxqueue` operations, when producers
+       outrun the terminal the oldest operations are dropped (and counted,
+       see :attr:`dropped`).
+
+       Windows can also be written to from other processes, through a
+       :class:`WindowProxy` (see :meth:`proxy`).  Pass `mp_context` if the
+       processes are started from a specific multiprocessing context.
+    """
+    def __init__(self, screen, fps=30, maxqueue=10000, mp_context=None):
+        self.screen = screen
+        self.mp_context = mp_context
+        self.fps = fps
+        self.maxqueue = maxqueue
+        self.windows = []
+        self.frames = 0
+        import threading
+        self._threading = threading
+        self._stopped = threading.Event()
+        self._thread = None
+        self._inbox = None  # multiprocessing queue of (window index, ops)
+
+    def window(self, x, y, width, height, **kw):
+        """Create a new window that is painted by this renderer.  The
+           window is ``deferred`` (unless you pass ``deferred=False``), so
+           only its changes are painted each frame.
+        """
+        kw.setdefault('deferred', True)
+        return self.attach(Window(self.screen, x, y, width, height, **kw))
+
+    def attach(self, window):
+        """Let this renderer paint `window` (returns the window).
+        """
+        window._queue = deque(maxlen=self.maxqueue)
+        self.windows.append(window)
+        return window
+
+    def proxy(self, window, batch=100):
+        """Return a :class:`WindowProxy` for `window` (attached to this
+           renderer), which can be passed to a child process::
+
+               r = Renderer(scr)
+               windows = [r.window(i * 20, 0, 19, 20) for i in range(4)]
+               procs = [
+                   multiprocessing.Process(target=work, args=(r.proxy(w),))
+                   for w in windows
+               ]
+
+           Create all proxies before starting the processes.
+        """
+        if self._inbox is None:
+            mp = self.mp_context
+            if mp is None:
+                import multiprocessing as mp
+            try:
+                from queue import Empty
+            except ImportError:  # pragma: nocover (python 2)
+                from Queue import Empty
+            self._inbox = mp.Queue()
+            self._empty = Empty
+        return WindowProxy(
+            self._inbox, self.windows.index(window),
+            window.width, window.height, batch, 1.0 / self.fps
+        )
+
+    def _receive(self):
+        """Queue the operations sent by window proxies.
+        """
+        inbox = self._inbox
+        while True:
+            try:
+                index, ops = inbox.get_nowait()
+            except self._empty:
+                return
+            w = self.windows[index]
+            for op in ops:
+                if op[0] in WindowProxy.operations:
+                    w._enqueue(getattr(w, op[0]), *op[1:])
+
+    @property
+    def queue_depth(self):
+        """The number of operations waiting to be rendered.
+        """
+        return sum(len(w._queue) for w in self.windows)
+
+    @property
+    def dropped(self):
+        """The number of operations that were dropped because a window's
+           queue was full (approximate, producers aren't synchronized).
+        """
+        return sum(w.dropped for w in self.windows)
+
+    def stats(self):
+        """Return a dict with the current queue depth, dropped operations,
+           and the number of frames rendered.
+        """
+        return dict(
+            queue_depth=self.queue_depth,
+            dropped=self.dropped,
+            frames=self.frames,
+        )
+
+    def render(self):
+        """Apply all queued operations, as one output frame.
+        """
+        with screen_lock:
+            if self._inbox is not None:
+                self._receive()
+            with self.screen.frame():
+                for w in self.windows:
+                    queue = w._queue
+                    while queue:
+                        fn, args = queue.popleft()
+                        fn(*args)
+                    w.render()
+        self.frames += 1
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        while not self._stopped.wait(interval):
+            self.render()
+        self.render()
+
+    def start(self):
+        """Start the render thread.
+        """
+        self._stopped.clear()
+        self._thread = self._threading.Thread(
+            target=self._run, name='screen-renderer'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the render thread (after rendering what is queued).
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+class WindowProxy(object):
+    """Stands in for a :class:`Window` in another process (see
+       :meth:`Renderer.proxy`).
+
+       Operations are collected in batches and sent to the parent process,
+       whose renderer paints them.  A batch is sent when it holds `batch`
+       operations, and by :meth:`flush`.  While operations are waiting, a
+       background thread sends them after a frame, so output shows up even
+       when the process stops writing (e.g. to start a long job).  Call
+       :meth:`flush` (or use the proxy as a context manager) before the
+       process ends, so the last operations aren't lost.
+    """
+    operations = frozenset(['_write_text', '_newline', '_writexy', '_cls'])
+
+    def __init__(self, inbox, index, width, height, batch=100, interval=0.03):
+        self.width = width
+        self.height = height
+        self.batch = batch
+        self.interval = interval
+        self._inbox = inbox
+        self._index = index
+        self._ops = []
+        self._lock = _RLock()
+        self._flusher = None  # running while operations are waiting
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state.update(_ops=[], _flusher=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = _RLock()
+
+    def _start_flusher(self):
+        import threading
+        self._flusher = threading.Thread(
+            target=self._flush_pending, name='screen-proxy-flusher'
+        )
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def _flush_pending(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._ops:
+                    # idle, the next operation starts a new thread
+                    self._flusher = None
+                    return
+                self._send()
+
+    def _send(self):
+        # called with the lock held, so batches are put in order
+        ops, self._ops = self._ops, []
+        self._inbox.put((self._index, ops))
+
+    def _add(self, op):
+        with self._lock:
+            self._ops.append(op)
+            if len(self._ops) >= self.batch:
+                self._send()
+            elif self._flusher is None:
+                self._start_flusher()
+
+    def write(self, *args):
+        """Write to the current position in the window (see
+           :meth:`Window.write`).
+        """
+        self._add(('_write_text', ' '.join(str(arg) for arg in args)))
+
+    def newline(self):
+        """Move the writing position to the start of the next line.
+        """
+        self._add(('_newline',))
+
+    def writexy(self, x, y, txt):
+        """Write to position x, y relative to the window.
+        """
+        self._add(('_writexy', x, y, txt))
+
+    def cls(self, color=None):
+        """Clear the window, fill it with the given color.
+        """
+        self._add(('_cls', color))
+
+    def flush(self):
+        """Send the operations that are waiting.
+        """
+        with self._lock:
+            if self._ops:
+                self._send()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+
+class _Layer(object):
+    """A window in a :class:`Compositor`, and the buffered screen it draws
+       on (`surface`).
+    """
+    __slots__ = ('window', 'surface', 'x', 'y', 'visible')
+
+    def __init__(self, window, surface, x, y):
+        self.window = window
+        self.surface = surface
+        self.x = x
+        self.y = y
+        self.visible = True
+
+    def rect(self):
+        return self.x, self.y, self.surface.width, self.surface.height
+
+
+class Compositor(object):
+    """Stacks (possibly overlapping) windows on a buffered screen.
+
+       Each window draws on its own off-screen surface.  :meth:`compose`
+       copies the visible parts of the windows into the screen's back
+       buffer, but only for the regions that were damaged: by content
+       changes, or by moving, raising, lowering, hiding or removing a
+       window.  A popup can be opened and closed without redrawing what
+       is underneath::
+
+           comp = Compositor(Screen(buffered=True))
+           log = comp.window(0, 0, 80, 24)
+           ...
+           popup = comp.window(20, 8, 40, 6)
+           popup.write('Are you sure?')
+           comp.present()
+           comp.remove(popup)  # the log is visible again
+           comp.present()
+
+       Windows are opaque, the last one created is on top.
+    """
+    def __init__(self, screen):
+        if not screen.buffered:
+            raise ValueError("the Compositor needs a buffered screen")
+        self.screen = screen
+        self.layers = []    # bottom to top
+        self._damage = {}   # {y: (x0, x1)} in screen coordinates
+        screen.on_resize(self._on_resize)
+
+    def window(self, x, y, width, height, **kw):
+        """Create a new window at x, y, on top of the others.
+        """
+        surface = _Surface(width, height)
+        surface.fg, surface.bg = self.screen.fg, self.screen.bg
+        w = Window(surface, 0, 0, width, height, **kw)
+        layer = _Layer(w, surface, x, y)
+        self.layers.append(layer)
+        self._damage_rect(*layer.rect())
+        return w
+
+    def _layer(self, window):
+        for layer in self.layers:
+            if layer.window is window:
+                return layer
+        raise ValueError("%r is not in this compositor" % window)
+
+    def move(self, window, x, y):
+        """Move `window` to x, y.
+        """
+        layer = self._layer(window)
+        self._damage_rect(*layer.rect())
+        layer.x, layer.y = x, y
+        self._damage_rect(*layer.rect())
+
+    def raise_window(self, window):
+        """Put `window` on top of the other windows.
+        """
+        layer = self._layer(window)
+        self.layers.remove(layer)
+        self.layers.append(layer)
+        self._damage_rect(*layer.rect())
+
+    def lower_window(self, window):
+        """Put `window` below the other windows.
+        """
+        layer = self._layer(window)
+        self.layers.remove(layer)
+        self.layers.insert(0, layer)
+        self._damage_rect(*layer.rect())
+
+    def hide(self, window):
+        """Hide `window` (it keeps its content, see :meth:`show`).
+        """
+        self._set_visible(window, False)
+
+    def show(self, window):
+        """Show a hidden window again.
+        """
+        self._set_visible(window, True)
+
+    def _set_visible(self, window, visible):
+        layer = self._layer(window)
+        if layer.visible != visible:
+            layer.visible = visible
+            self._damage_rect(*layer.rect())
+
+    def remove(self, window):
+        """Remove `window` from the screen.
+        """
+        layer = self._layer(window)
+        self.layers.remove(layer)
+        self._damage_rect(*layer.rect())
+
+    def _damage_rect(self, x, y, width, height):
+        """Mark the rectangle (in screen coordinates) for recomposition.
+        """
+        x0, x1 = max(x, 0), min(x + width, self.screen.width)
+        if x0 >= x1:
+            return
+        damage = self._damage
+        for row in range(max(y, 0), min(y + height, self.screen.height)):
+            span = damage.get(row)
+            if span is None:
+                damage[row] = (x0, x1)
+            else:
+                damage[row] = (min(x0, span[0]), max(x1, span[1]))
+
+    def _on_resize(self, screen):
+        self._damage_rect(0, 0, screen.width, screen.height)
+
+    def compose(self):
+        """Update the screen's back buffer where it is damaged.
+        """
+        with screen_lock:
+            for layer in self.layers:
+                surface = layer.surface
+                changed = False
+                for x, y, cells in surface._back.changed_runs(surface._front, gap=0):
+                    changed = True
+                    if layer.visible:
+                        self._damage_rect(layer.x + x, layer.y + y, len(cells), 1)
+                if changed:
+                    surface._front = surface._back.copy()
+
+            back = self.screen._back
+            blank = _CellGrid.blank
+            visible = [l for l in self.layers if l.visible]
+            for y, (x0, x1) in self._damage.items():
+                if y >= back.height:
+                    continue
+                x1 = min(x1, back.width)
+                row = [blank] * (x1 - x0)
+                for layer in visible:
+                    lx, ly, width, height = layer.rect()
+                    if not ly <= y < ly + height:
+                        continue
+                    a, b = max(x0, lx), min(x1, lx + width)
+                    if a < b:
+                        row[a - x0:b - x0] = layer.surface._back.cells(
+                            y - ly, a - lx, b - lx
+                        )
+                back.put_cells(x0, y, row)
+            self._damage = {}
+
+    def present(self):
+        """Compose, and send the changes to the terminal.
+        """
+        with screen_lock:
+            self.screen.check_resize()
+            self.compose()
+            self.screen.present()
+
+
 class Screen(object):
     """Screen provides a interface for positioned writing, with color,
        to the screen.
@@ -303,6 +1815,10 @@ class Screen(object):
     colors = ('black', 'red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white')
     _foreground = {cname: i + 30 for i, cname in enumerate(colors)}
     _background = {cname: i + 40 for i, cname in enumerate(colors)}
+    _fg_synonyms = ('foreground', 'color', 'fg')
+    _bg_synonyms = ('background', 'on', 'bg')
+    # the methods that are timed when statistics are enabled
+    _timed_methods = ('writexy', 'writelinesxy', 'present', 'fill', 'writemany')
 
     def __init__(self, screeninfo=None, **kw):
         """Default foreground and background colors can be specified as e.g.::
@@ -321,24 +1837,240 @@ class Screen(object):
 
                scr = Screen(color='red', on='black')
 
+           Output goes to ``sys.stdout`` (wrapped by colorama on windows
+           consoles that need it), unless a `stream` is given.  Use
+           ``stream=sys.__stdout__`` to write the ANSI sequences straight to
+           the real stdout, bypassing any wrappers.  Any object with `write`
+           and `flush` methods can be used, e.g. a :class:`VirtualTerminal`
+           (in which case the screen gets the virtual terminal's size), or an
+           :class:`FdOutput` which writes each frame straight to the file
+           descriptor with a single ``os.write``::
+
+               scr = Screen(stream=FdOutput())
+
+           Windows are scrolled in place with the terminal's scroll regions
+           (DECSTBM) when they span the full screen width.  Terminals that
+           support left/right margins (DECSLRM, e.g. xterm) can scroll any
+           window in place, which you can enable with ``margins=True``.
+           Pass ``scroll_regions=False`` if the terminal doesn't understand
+           scroll regions at all.
+
+           Rectangles of spaces are cleared with erase sequences (ECH, EL,
+           ED), which paint the current background color on all modern
+           terminals, instead of sending the spaces.  Use ``erase=False`` to
+           turn this off.  With ``repeat=True`` other fill characters are
+           sent once per line and repeated by the terminal (REP, supported
+           by e.g. xterm and VTE-based terminals).
+
+           Output statistics are collected with ``stats=True`` (see
+           :class:`ScreenStats`).
+
+           With ``buffered=True`` all writes go to an in-memory back buffer,
+           and nothing is sent to the terminal until :meth:`present` is
+           called.  Only the cells that changed since the previous
+           :meth:`present` are sent::
+
+               scr = Screen(buffered=True)
+               while True:
+                   draw_dashboard(scr)  # redraw everything, every tick
+                   scr.present()        # ..but only send what changed
+
+           For large terminals or high frame rates, ``grid='numpy'`` keeps
+           the back buffer in numpy arrays (requires numpy, implies
+           ``buffered=True``), which makes finding the changed cells,
+           fills and window scrolling vectorized operations.
+
         """
-        s = screeninfo or ScreenInfo()
-        self.buffer_width = s.width
-        self.buffer_height = s.height
+        buffered = kw.pop('buffered', False)
+        grid = kw.pop('grid', None)
+        self.stats = kw.pop('stats', None)
+        if self.stats is None and os.environ.get('SCREEN_STATS'):
+            self.stats = ScreenStats()
+            import atexit
+            atexit.register(lambda: sys.stderr.write(self.stats.summary()))
+        elif self.stats is True:
+            self.stats = ScreenStats()
+        elif not self.stats:
+            self.stats = None
+        if self.stats is not None:
+            _time_methods(self, self._timed_methods)
+        self.stream = kw.pop('stream', None)
+        if screeninfo is None:
+            screeninfo = getattr(self.stream, 'screeninfo', None)
+        self.scroll_regions = kw.pop('scroll_regions', USE_ANSI)
+        self.margins = kw.pop('margins', False)
+        self.erase = kw.pop('erase', USE_ANSI and sys.platform != 'win32')
+        self.repeat = kw.pop('repeat', False)
+        s = self._info = screeninfo or ScreenInfo.current()
+        self._generation = getattr(s, 'generation', None)
+        self._resize_callbacks = []
+        self.layout = None  # the Layout of the last windows() call
         self.buffer_x = s.x
         self.buffer_y = s.y
-        self.buffer_left = s.left
-        self.buffer_top = s.top
-        self.buffer_right = s.right
-        self.buffer_bottom = s.bottom
-        self.maxx = s.maxx
-        self.maxy = s.maxy
 
         self.xpos = self.buffer_x - self.buffer_left + 1
         self.ypos = self.buffer_y - self.buffer_top + 1
         self.fg = self.bg = ''
         self.fg, self.bg = self._get_colors(kw)
         self._cursor_stack = []
+        self._frame = None
+        self._frame_depth = 0
+        self._attrs = _DEFAULT_ATTRS  # the colors the terminal is set to
+        self._cx = self._cy = None    # where the terminal cursor is (if known)
+        self.cursor = _Cursor(self)
+        self._back = self._front = None
+        self._grid = _GRIDS[grid or 'list']
+        if buffered or grid:
+            self._back = self._grid(self.width, self.height)
+            self._front = self._grid(self.width, self.height, cell=None)
+
+    # the geometry follows the (possibly resized) screen info
+    buffer_width = property(lambda self: self._info.width)
+    buffer_height = property(lambda self: self._info.height)
+    buffer_left = property(lambda self: self._info.left)
+    buffer_top = property(lambda self: self._info.top)
+    buffer_right = property(lambda self: self._info.right)
+    buffer_bottom = property(lambda self: self._info.bottom)
+    maxx = property(lambda self: self._info.maxx)
+    maxy = property(lambda self: self._info.maxy)
+
+    def on_resize(self, callback):
+        """Call ``callback(screen)`` after the terminal has been resized
+           (returns `callback`, so it can be used as a decorator).
+        """
+        self._resize_callbacks.append(callback)
+        return callback
+
+    def check_resize(self):
+        """Adjust to a resized terminal, if needed.  This is cheap, and is
+           called at the start of every frame (and unframed write).
+           Returns True if the screen was resized.
+        """
+        info = self._info
+        if self._generation is None:
+            return False  # a screen info object that doesn't track resizes
+        info.poll()
+        if info.generation == self._generation:
+            return False
+        self._generation = info.generation
+        self.invalidate()
+        if self._back is not None:
+            self._back = self._back.resized(self.width, self.height)
+            self._front = self._grid(self.width, self.height, cell=None)
+        self._begin_frame()
+        try:
+            for callback in list(self._resize_callbacks):
+                callback(self)
+        finally:
+            self._end_frame()
+        return True
+
+    def _out(self, data):
+        """Send `data` to the terminal, or to the current frame.
+        """
+        if self._frame is not None:
+            self._frame.append(data)
+        else:
+            self._write_out(data)
+
+    def _write_out(self, data):
+        """Write `data` to the terminal (all output ends up here).
+        """
+        if self.stats is not None:
+            self.stats.output(data)
+        (self.stream or _stdout()).write(data)
+
+    def _flush_out(self):
+        if self.stats is not None:
+            self.stats.flushes += 1
+        (self.stream or _stdout()).flush()
+
+    @property
+    def in_frame(self):
+        """True while output is being collected by :meth:`frame`.
+        """
+        return self._frame is not None
+
+    def _begin_frame(self):
+        self._frame_depth += 1
+        if self._frame_depth == 1:
+            self._frame = []
+            if self.stats is not None:
+                self.stats.begin_frame()
+            # resize callbacks paint into this frame
+            self.check_resize()
+
+    def _end_frame(self):
+        self._frame_depth -= 1
+        if self._frame_depth == 0:
+            if self._attrs != _DEFAULT_ATTRS:
+                self._frame.append(self._default_attrs())
+            data = ''.join(self._frame)
+            self._frame = None
+            if data:
+                self._write_out(data)
+                self._flush_out()
+            if self.stats is not None:
+                self.stats.end_frame()
+
+    def _set_attrs(self, fg, bg):
+        """Return the SGR sequence that changes the terminal colors to
+           `fg`, `bg`, or ``''`` if they are already set.
+        """
+        attrs = fg, bg
+        if attrs == self._attrs:
+            return ''
+        self._attrs = attrs
+        if fg and bg:
+            return _sgr[attrs]
+        return _sgr_reset[attrs]
+
+    def _default_attrs(self):
+        """Return the sequence (if any) needed to reset the terminal colors.
+        """
+        if self._attrs == _DEFAULT_ATTRS or not USE_ANSI:
+            return ''
+        self._attrs = _DEFAULT_ATTRS
+        return '\x1b[0m'
+
+    def close(self):
+        """Reset the terminal colors (if they were left set) and flush the
+           output.
+        """
+        self._out(self._default_attrs())
+        if self._frame is None:
+            self._flush_out()
+
+    @contextmanager
+    def frame(self):
+        """Collect all output (escape sequences and text) in memory, and
+           send it with a single write (and flush) when the block exits::
+
+               with scr.frame():
+                   scr.cls('blue')
+                   scr.writexy(0, 0, 'title')
+                   with scr.cursor.hidden():
+                       ...
+
+           Frames can be nested, only the outermost frame writes.  A
+           buffered screen is presented when the outermost frame exits.
+
+           Colors are only changed when a write needs different colors
+           than the previous one, and reset once, at the end of the frame.
+        """
+        self._begin_frame()
+        try:
+            yield self
+        finally:
+            if self._frame_depth == 1 and self._back is not None:
+                self.present()
+            self._end_frame()
+
+    @property
+    def buffered(self):
+        """True if writes go to a back buffer (see :meth:`present`).
+        """
+        return self._back is not None
 
     # backwards compatibility setters/getters
     @property
@@ -373,43 +2105,36 @@ class Screen(object):
         txt = self.format(*args, **kw)
         if not USE_ANSI:
             return txt
-        colors = self._get_colors(kw)
-        setcolor = '\x1b[%sm' % ';'.join([str(c) for c in colors if c])
-        clearcolor = '\x1b[0m'
-        return setcolor + str(txt) + clearcolor
+        return _sgr[self._get_colors(kw)] + txt + '\x1b[0m'
 
     def _get_colors(self, kw):
         """Grab color synonyms from `kw`.
         """
-        kwkeys = set(kw.keys())
-
-        def getcolor(which, synonyms, default=''):
-            key = synonyms & kwkeys
-            if key:
-                return which.get(
-                    kw.pop(key.pop()).lower(),
-                    default
-                )
-            return default
-
-        fg = getcolor(self._foreground, {'foreground', 'color', 'fg'}, self.fg)
-        bg = getcolor(self._background, {'background', 'on', 'bg'}, self.bg)
+        fg, bg = self.fg, self.bg
+        if not kw:
+            return fg, bg
+        for key in self._fg_synonyms:
+            if key in kw:
+                fg = self._foreground.get(kw.pop(key).lower(), fg)
+                break
+        for key in self._bg_synonyms:
+            if key in kw:
+                bg = self._background.get(kw.pop(key).lower(), bg)
+                break
         return fg, bg
 
-    def windows(self, xcount, ycount):
+    def windows(self, xcount, ycount, **kw):
         """Returns a list of ``count`` symetrically created windows.
+
+           The windows are managed by a :class:`Layout` (available as
+           ``scr.layout``), which re-fits them when the terminal is resized.
+           Keyword arguments are passed on to the :class:`Window` constructor.
+           The windows of a previous call are no longer re-fitted.
         """
-        wwidth = self.width // xcount
-        wheight = self.height // ycount
-        assert wwidth > 6 and wheight > 6
-        rows = []
-        for y in range(ycount):
-            cols = []
-            for x in range(xcount):
-                w = Window(self, x * wwidth, y * wheight, wwidth - 1, wheight - 1)
-                cols.append(w)
-            rows.append(cols)
-        return rows
+        if self.layout is not None:
+            self.layout.close()
+        self.layout = Layout(self, xcount, ycount, **kw)
+        return self.layout.rows
 
     @property
     def left(self):
@@ -478,6 +2203,7 @@ class Screen(object):
     def __repr__(self):
         tmp = self.coords
         tmp.update(self.__dict__)
+        import pprint
         return pprint.pformat(tmp, width=35)
 
     def pos(self):
@@ -489,12 +2215,75 @@ class Screen(object):
         "Position the cursor at x, y (where x, y are zero-based coordinates)."
         if not USE_ANSI:
             return ""
-        return '\x1b[%d;%dH' % (y + 1, x + 1)
+        return _cup[x, y]
+
+    def _move(self, x, y):
+        """Return the cheapest sequence that moves the terminal cursor to
+           x, y (and remember that it's there).  Depending on where the
+           cursor is, this is nothing, CR, relative moves, re-printing the
+           (known) cells in between, or an absolute cursor position.
+        """
+        if not USE_ANSI:
+            return ""
+        cx, cy = self._cx, self._cy
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            self._cx = self._cy = None
+            return _cup[x, y]
+        self._cx, self._cy = x, y
+        if cx == x and cy == y:
+            return ''
+        best = _cup[x, y]
+        if cx is None:
+            return best
+
+        if y == cy:
+            vert = ''
+        elif y < cy:
+            vert = _cuu[cy - y]
+        else:
+            vert = _cud[y - cy]
+
+        if x == cx:
+            horiz = ''
+        elif x == 0:
+            horiz = '\r'
+        elif x < cx:
+            horiz = _cub[cx - x]
+        else:
+            horiz = _cuf[x - cx]
+            if not vert and x - cx < len(horiz) and self._front is not None:
+                cells = self._front.cells(y, cx, x)
+                if all(c is not None and c[1:] == self._attrs for c in cells):
+                    horiz = ''.join(c[0] for c in cells)
+
+        if len(vert) + len(horiz) < len(best):
+            return vert + horiz
+        return best
+
+    def _moved(self, x, txt=''):
+        """The terminal cursor was moved to column `x` on the same line
+           by writing `txt` (control characters in `txt`, e.g. newlines,
+           can move it anywhere).
+        """
+        if self._cx is not None:
+            if _has_controls(txt):
+                self._cx = self._cy = None
+            else:
+                self._cx = x if 0 <= x < self.width else None
+
+    def invalidate(self):
+        """Forget what we know about the terminal's cursor position and
+           colors.  Call this after writing to the terminal without going
+           through the screen object (e.g. after ``input()``).
+        """
+        self._cx = self._cy = None
+        self._attrs = None
 
     def gotoxy(self, x, y):
         """Put cursor at coordinates ``x``, ``y``.
         """
-        sys.stdout.write(self._xy(x, y) + '')
+        if self._back is None:
+            self._out(self._move(x, y))
         self.ypos = y
         self.xpos = x
 
@@ -503,18 +2292,32 @@ class Screen(object):
         """
         self.gotoxy(pos.x, pos.y)
 
+    def _cursor_delta(self, dx, dy, esc):
+        if self._cx is not None:
+            x, y = self._cx + dx, self._cy + dy
+            self._cx = min(max(x, 0), self.width - 1)
+            self._cy = min(max(y, 0), self.height - 1)
+        self._out(esc)
+
     def cursor_left(self, n=1):
-        sys.stdout.write('\b')
-        #sys.stdout.write('\033{n}D'.format(n=n))
+        """Move the cursor `n` columns left.
+        """
+        self._cursor_delta(-n, 0, _cub[n])
 
     def cursor_right(self, n=1):
-        sys.stdout.write('\x1b{n}C'.format(n=n))
+        """Move the cursor `n` columns right.
+        """
+        self._cursor_delta(n, 0, _cuf[n])
 
     def cursor_up(self, n=1):
-        sys.stdout.write('\x1b{n}A'.format(n=n))
+        """Move the cursor `n` lines up.
+        """
+        self._cursor_delta(0, -n, _cuu[n])
 
     def cursor_down(self, n=1):
-        sys.stdout.write('\x1b{n}B'.format(n=n))
+        """Move the cursor `n` lines down.
+        """
+        self._cursor_delta(0, n, _cud[n])
 
     def save_cursor_position(self):
         """Saves the current cursor position. You can move the cursor to the 
@@ -522,13 +2325,14 @@ class Screen(object):
            sequence. 
         """
         # self._cursor_stack.append(self.pos())
-        sys.stdout.write('\x1b[s')
+        self._out('\x1b[s')
 
     def restore_cursor_position(self):
         """Returns the cursor to the position stored by the 
            Save Cursor Position sequence. 
         """
-        sys.stdout.write('\x1b[u')
+        self._out('\x1b[u')
+        self._cx = self._cy = None
         # self.xpos, self.ypos = self._cursor_stack.pop()
 
     def writelinesxy(self, x, y, *args, **kw):
@@ -537,13 +2341,20 @@ class Screen(object):
         """
         txt = self.format(*args, **kw)
         lines = txt.split('\n')
-        for i, line in enumerate(lines):
-            self.writexy(x, y + i, line, **kw)
+        self._begin_frame()
+        try:
+            for i, line in enumerate(lines):
+                self.writexy(x, y + i, line, **kw)
+        finally:
+            self._end_frame()
 
     def print(self, *args, **kwargs):
         """Write output without cursor positioning.
         """
-        print(self.color(*args, **kwargs), end=kwargs.get('end', '\n'))
+        self._out(self._default_attrs())
+        self._cx = self._cy = None
+        print(self.color(*args, **kwargs), end=kwargs.get('end', '\n'),
+              file=self.stream or _stdout())
 
     def write(self, *args, **kw):
         """Write args at current location, see writexy function for keyword
@@ -569,11 +2380,119 @@ class Screen(object):
            colors by e.g. changing values in the registry:
            https://github.com/neilpa/cmd-colors-solarized)
         """
-        txt = self.format(*args, **kw)
-        sys.stdout.write(self._xy(x, y) + self.color(txt, **kw))
+        if self._frame is None:
+            self.check_resize()
+        if kw:
+            txt = self.format(*args, **kw)
+            fg, bg = self._get_colors(kw)
+        else:
+            # fast path for the common ``writexy(x, y, 'text')``
+            if len(args) == 1 and isinstance(args[0], str):
+                txt = args[0]
+            else:
+                txt = self.format(*args)
+            fg, bg = self.fg, self.bg
+        if self._back is not None:
+            self._back.put(x, y, txt, fg, bg)
+        elif USE_ANSI:
+            out = self._move(x, y) + self._set_attrs(fg, bg) + txt
+            self._moved(x + len(txt), txt)
+            if self._frame is None:
+                out += self._default_attrs()
+            self._out(out)
+        else:
+            self._out(txt)
         self.ypos = y
         self.xpos = x + len(txt)
 
+    def writemany(self, items):
+        """Write many texts at once.  `items` is an iterable of
+           ``(x, y, text)`` or ``(x, y, text, fg, bg)`` tuples (or the rows
+           of a numpy structured array with those fields), where `fg` and
+           `bg` are color names (``None`` for the screen's colors).
+
+           The items are written in row/column order, so cursor moves are
+           short (and not needed between adjacent items), colors are only
+           changed where they differ, and everything is sent as one write.
+        """
+        fgs, bgs = {None: self.fg, '': self.fg}, {None: self.bg, '': self.bg}
+        cells = []
+        for item in items:
+            x, y, txt = item[0], item[1], item[2]
+            fg = bg = None
+            if len(item) > 3:
+                fg = item[3]
+                bg = item[4] if len(item) > 4 else None
+            if fg not in fgs:
+                fgs[fg] = self._foreground.get(_text(fg).lower(), self.fg)
+            if bg not in bgs:
+                bgs[bg] = self._background.get(_text(bg).lower(), self.bg)
+            cells.append((int(y), int(x), _text(txt), fgs[fg], bgs[bg]))
+        if not cells:
+            return
+        cells.sort(key=lambda c: c[:2])
+
+        self._begin_frame()
+        try:
+            if self._back is not None:
+                put = self._back.put
+                for y, x, txt, fg, bg in cells:
+                    put(x, y, txt, fg, bg)
+            elif USE_ANSI:
+                out = []
+                for y, x, txt, fg, bg in cells:
+                    out.append(self._move(x, y))
+                    out.append(self._set_attrs(fg, bg))
+                    out.append(txt)
+                    self._moved(x + len(txt), txt)
+                self._out(''.join(out))
+            else:
+                for y, x, txt, _, _ in cells:
+                    self._out(txt)
+        finally:
+            self._end_frame()
+        self.ypos = y
+        self.xpos = x + len(txt)
+
+    def present(self):
+        """Send the cells of the back buffer that changed since the last
+           call to the terminal (in as few runs as possible).  The first
+           call sends the entire back buffer.
+
+           The terminal cursor is left at the current writing position
+           (see :meth:`gotoxy`).
+
+           If the screen isn't buffered, this just flushes the output.
+        """
+        if self._back is not None:
+            out = []
+            for x, y, cells in self._back.changed_runs(self._front):
+                out.append(self._move(x, y))
+                out.append(self._cells(cells))
+                self._moved(x + len(cells), ''.join([c[0] for c in cells]))
+            out.append(self._move(self.xpos, self.ypos))
+            if self._frame is None:
+                out.append(self._default_attrs())
+            self._out(''.join(out))
+            self._front = self._back.copy()
+        if self._frame is None:
+            self._flush_out()
+
+    flush = present
+
+    def _cells(self, cells):
+        """Return the string that draws `cells` (a list of (char, fg, bg)
+           tuples), changing colors only where needed.
+        """
+        if not USE_ANSI:
+            return ''.join(c for c, _, _ in cells)
+        out = []
+        for c, fg, bg in cells:
+            if (fg, bg) != self._attrs:
+                out.append(self._set_attrs(fg, bg))
+            out.append(c)
+        return ''.join(out)
+
     def rightxy(self, x, y, *args, **kw):
         """Write text right justified at coordinates x, y.
            The last character will be written at position
@@ -602,54 +2521,156 @@ class Screen(object):
         """Fill rectangle with char, and leave the writing position at
            the beginning of the rectangle (position x,y).
         """
-        for ypos in range(y, y + height):
-            self.writexy(x, ypos, char * width, **kw)
+        if self._back is None and USE_ANSI and (
+                (self.erase and char == ' ') or (self.repeat and len(char) == 1)):
+            self._fast_fill(x, y, width, height, char, kw)
+            self.xpos = x
+            self.ypos = y
+            return
+        if self._back is not None and len(char) == 1:
+            if self._frame is None:
+                self.check_resize()
+            self._back.fill(x, y, width, height, (char,) + self._get_colors(kw))
+            self.xpos = x
+            self.ypos = y
+            return
+        self._begin_frame()
+        try:
+            for ypos in range(y, y + height):
+                self.writexy(x, ypos, char * width, **kw)
+        finally:
+            self._end_frame()
         self.xpos = x
         self.ypos = y
 
+    def _fast_fill(self, x, y, width, height, char, kw):
+        """Fill the rectangle using erase (ECH/EL/ED) or repeat (REP)
+           sequences instead of sending every character.
+        """
+        fg, bg = self._get_colors(kw)
+        x0, x1 = max(x, 0), min(x + width, self.width)
+        y0, y1 = max(y, 0), min(y + height, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        n = x1 - x0
+        out = [self._set_attrs(fg, bg)]
+        if char == ' ' and self.erase:
+            if n == self.width and y1 - y0 == self.height:
+                out.append('\x1b[2J')
+            else:
+                # erasing doesn't move the cursor
+                erase = '\x1b[K' if x1 == self.width else _ech[n]
+                for row in range(y0, y1):
+                    out.append(self._move(x0, row))
+                    out.append(erase)
+        else:
+            line = char * n if n < 6 else char + '\x1b[%db' % (n - 1)
+            for row in range(y0, y1):
+                out.append(self._move(x0, row))
+                out.append(line)
+                self._moved(x1, char)
+        if self._frame is None:
+            out.append(self._default_attrs())
+        self._out(''.join(out))
+
     def erase_line(self):
         """Clears all characters from the current
            line (including the character at the cursor position). 
            Keep cursor stationary.
         """
-        sys.stdout.write('\x1b[2K')
+        if self._back is not None:
+            self._back.fill(0, self.ypos, self.width, 1)
+        else:
+            self._out(self._default_attrs() + '\x1b[2K')
 
     def erase_line_left(self):
         """Clears all characters from the cursor position to the start of the
            line (including the character at the cursor position).
            Keep cursor stationary. 
         """
-        sys.stdout.write('\x1b[1K')
+        if self._back is not None:
+            self._back.fill(0, self.ypos, self.xpos + 1, 1)
+        else:
+            self._out(self._default_attrs() + '\x1b[1K')
 
     def erase_line_right(self):
         """Clears all characters from the cursor position to the end of the
            line (including the character at the cursor position). 
            Keep cursor stationary.
         """
-        sys.stdout.write('\x1b[0K')
+        if self._back is not None:
+            self._back.fill(self.xpos, self.ypos, self.width - self.xpos, 1)
+        else:
+            self._out(self._default_attrs() + '\x1b[0K')
 
     def scroll_window_up(self):
-        sys.stdout.write('\x1bD')
+        self._out(self._default_attrs() + '\x1bD')
+        # IND moves the cursor down (unless it is on the bottom line)
+        self._cx = self._cy = None
 
     def scroll_window_down(self):
-        sys.stdout.write('\x1bM')
+        self._out(self._default_attrs() + '\x1bM')
+        self._cx = self._cy = None
+
+    def can_scroll(self, x, width):
+        """Can a rectangle spanning columns x..x+width be scrolled in place
+           by the terminal (see :meth:`scroll_region`)?
+        """
+        if self._back is not None:
+            return True  # the back buffer can scroll anything
+        if not self.scroll_regions:
+            return False
+        return self.margins or (x <= 0 and x + width >= self.width)
+
+    def scroll_region(self, x, y, width, height, n=1):
+        """Scroll the contents of the rectangle up `n` lines, using the
+           terminal's scroll region (and left/right margin) support.  The
+           exposed lines at the bottom are cleared.  Check
+           :meth:`can_scroll` first.
+
+           On a buffered screen the back buffer is scrolled.
+        """
+        if self._back is not None:
+            self._back.scroll(x, y, width, height, n)
+            return
+        out = [self._default_attrs(), '\x1b[%d;%dr' % (y + 1, y + height)]
+        if not (x <= 0 and x + width >= self.width):
+            out.append('\x1b[?69h\x1b[%d;%ds' % (x + 1, x + width))
+        out.append('\x1b[%dS' % n)
+        if len(out) > 3:
+            out.append('\x1b[?69l')
+        out.append('\x1b[r')
+        self._out(''.join(out))
+        # setting the scroll region homes the cursor
+        self._cx = self._cy = None
 
     def erase_display_down(self):
         """Clears the screen from cursor down. 
         """
-        sys.stdout.write('\x1b[0J')
+        if self._back is not None:
+            self._back.fill(self.xpos, self.ypos, self.width - self.xpos, 1)
+            self._back.fill(0, self.ypos + 1, self.width, self.height)
+        else:
+            self._out(self._default_attrs() + '\x1b[0J')
 
     def erase_display_up(self):
         """Clears the screen from cursor up. 
         """
-        sys.stdout.write('\x1b[1J')
+        if self._back is not None:
+            self._back.fill(0, 0, self.width, self.ypos)
+            self._back.fill(0, self.ypos, self.xpos + 1, 1)
+        else:
+            self._out(self._default_attrs() + '\x1b[1J')
         self.xpos = self.ypos = 0        
 
     def erase_display(self):
         """Clears the screen and moves the cursor to the home position 
            (line 0, column 0). 
         """
-        sys.stdout.write('\x1b[2J')
+        if self._back is not None:
+            self._back.fill(0, 0, self.width, self.height)
+        else:
+            self._out(self._default_attrs() + '\x1b[2J')
         self.xpos = self.ypos = 0
 
     def cls(self, color=None):
@@ -661,3 +2682,363 @@ class Screen(object):
             self.fill(0, 0, self.width, self.height, char=' ', **args)
         else:
             self.erase_display()
+
+
+class _NullStream(object):
+    """An output stream that discards everything.
+    """
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+class _Surface(Screen):
+    """An off-screen buffered screen.  Its back buffer is read by the
+       object that owns it (e.g. a :class:`Compositor`), it is never
+       presented to a terminal.
+    """
+    def __init__(self, width, height, **kw):
+        super(_Surface, self).__init__(
+            ScreenInfo.fixed(width, height), buffered=True,
+            stream=_NullStream(), stats=False, **kw
+        )
+
+    def present(self):
+        pass
+
+    flush = present
+
+
+class FdOutput(object):
+    """Output stream that writes utf-8 straight to a file descriptor (the
+       real stdout by default), bypassing Python's text layer: no per-call
+       encoding, newline translation, or buffering.  A :class:`Screen`
+       frame is encoded once, and written with ``os.write``.  Partial
+       writes (and non-blocking file descriptors) are handled.
+
+       :meth:`writelines` sends a sequence of (pre-encoded) chunks with a
+       single ``os.writev`` call where available.
+    """
+    def __init__(self, fd=None, encoding='utf-8'):
+        if fd is None:
+            sys.__stdout__.flush()
+            fd = sys.__stdout__.fileno()
+        self.fd = fd
+        self.encoding = encoding
+
+    def write(self, data):
+        """Write all of `data` (text or bytes).
+        """
+        if not isinstance(data, bytes):
+            data = data.encode(self.encoding)
+        view = memoryview(data)
+        while view:
+            view = view[self._call(os.write, view):]
+
+    def writelines(self, chunks):
+        """Write all `chunks` (text or bytes), using ``os.writev``.
+        """
+        chunks = [c if isinstance(c, bytes) else c.encode(self.encoding)
+                  for c in chunks if c]
+        if not hasattr(os, 'writev'):
+            return self.write(b''.join(chunks))
+        start = 0
+        while start < len(chunks):
+            n = self._call(os.writev, chunks[start:start + 1024])  # IOV_MAX
+            # skip the chunks that were written completely, and the
+            # written part of the last one.
+            while start < len(chunks) and n >= len(chunks[start]):
+                n -= len(chunks[start])
+                start += 1
+            if n:
+                chunks[start] = chunks[start][n:]
+
+    def _call(self, fn, data):
+        while True:
+            try:
+                return fn(self.fd, data)
+            except OSError as e:
+                import errno
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                # non-blocking fd (e.g. shared with an asyncio transport)
+                import select
+                select.select([], [self.fd], [])
+
+    def flush(self):
+        pass  # nothing is buffered
+
+    def fileno(self):
+        return self.fd
+
+
+class VirtualTerminal(object):
+    """An in-memory terminal, that can be used as the output stream of a
+       :class:`Screen`.  It understands the subset of ANSI/VT100 sequences
+       that :class:`Screen` and :class:`Window` emit, and keeps the result
+       as a grid of :class:`Cell` (char, fg, bg) values, where the colors
+       are color names (or None for the default color)::
+
+           vt = VirtualTerminal(80, 25)
+           scr = Screen(stream=vt)
+           scr.writexy(2, 1, 'hello', fg='red')
+           assert vt.line(1) == '  hello'
+           assert vt.cell(2, 1) == Cell('h', 'red', None)
+
+       Output is counted in :attr:`writes`, :attr:`flushes` and
+       :attr:`bytes`, which makes it useful for benchmarks too.
+
+       With `newline_cr` (the default) a newline also returns the cursor
+       to the first column, like a tty does.
+    """
+    _tokens = None
+
+    def __init__(self, width=80, height=25, newline_cr=True):
+        if VirtualTerminal._tokens is None:
+            import re
+            VirtualTerminal._tokens = re.compile(
+                r'\x1b\[([?]?)([0-9;]*)([@-~])'  # CSI sequence
+                r'|\x1b([^\[])'                   # two character escape
+                r'|([\x00-\x1f])'                  # control character
+                r'|([^\x00-\x1f\x1b]+)'            # text
+            )
+            VirtualTerminal._incomplete = re.compile(r'\x1b(\[[?]?[0-9;]*)?\Z')
+        self.width = width
+        self.height = height
+        self.newline_cr = newline_cr
+        self.writes = self.flushes = self.bytes = 0
+        self.reset()
+
+    @property
+    def screeninfo(self):
+        """Screen info with the size of the virtual terminal.
+        """
+        return ScreenInfo.fixed(self.width, self.height)
+
+    def reset(self):
+        """Clear the terminal and reset all modes.
+        """
+        self.cells = [[Cell(' ', None, None)] * self.width
+                      for _ in range(self.height)]
+        self.x = self.y = 0
+        self.fg = self.bg = None
+        self.cursor_visible = True
+        self.top, self.bottom = 0, self.height - 1
+        self.left, self.right = 0, self.width - 1
+        self._margins_mode = False
+        self._wrap_pending = False
+        self._saved = (0, 0)
+        self._last = ' '
+        self._partial = ''
+
+    # stream interface
+
+    def write(self, data):
+        """Process output (text or utf-8 bytes).
+        """
+        if isinstance(data, bytes):
+            self.bytes += len(data)
+            data = data.decode('utf-8')
+        else:
+            self.bytes += len(data.encode('utf-8'))
+        self.writes += 1
+        data = self._partial + data
+        partial = self._incomplete.search(data)
+        if partial:
+            self._partial = partial.group()
+            data = data[:partial.start()]
+        else:
+            self._partial = ''
+        for m in self._tokens.finditer(data):
+            private, params, final, esc, ctrl, txt = m.groups()
+            if txt:
+                self._print(txt)
+            elif final:
+                self._csi(private, params, final)
+            elif ctrl:
+                self._control(ctrl)
+            elif esc:
+                self._escape(esc)
+
+    def flush(self):
+        self.flushes += 1
+
+    # inspecting the result
+
+    def cell(self, x, y):
+        """Return the :class:`Cell` at x, y.
+        """
+        return self.cells[y][x]
+
+    def line(self, y):
+        """Return the text of line `y` (without trailing spaces).
+        """
+        return ''.join(c.char for c in self.cells[y]).rstrip()
+
+    def text(self):
+        """Return the text of all lines (without trailing spaces).
+        """
+        return [self.line(y) for y in range(self.height)]
+
+    def __str__(self):
+        return '\n'.join(self.text())
+
+    # emulation
+
+    def _blank(self):
+        # erased cells get the current background color (bce)
+        return Cell(' ', None, self.bg)
+
+    def _erase(self, y, x0, x1):
+        self.cells[y][x0:x1] = [self._blank()] * (x1 - x0)
+
+    def _print(self, txt):
+        cells = self.cells
+        for ch in txt:
+            if self._wrap_pending:
+                self._wrap_pending = False
+                self.x = self.left
+                self._linefeed()
+            cells[self.y][self.x] = Cell(ch, self.fg, self.bg)
+            if self.x == self.right or self.x == self.width - 1:
+                self._wrap_pending = True
+            else:
+                self.x += 1
+        if txt:
+            self._last = txt[-1]
+
+    def _linefeed(self):
+        if self.y == self.bottom:
+            self._scroll(1)
+        elif self.y < self.height - 1:
+            self.y += 1
+
+    def _scroll(self, n):
+        """Scroll the scroll region up `n` lines (down if `n` is negative).
+        """
+        rows = self.cells[self.top:self.bottom + 1]
+        region = [row[self.left:self.right + 1] for row in rows]
+        blank = [self._blank()] * (self.right + 1 - self.left)
+        n = max(-len(region), min(n, len(region)))
+        if n > 0:
+            region = region[n:] + [blank[:] for _ in range(n)]
+        else:
+            region = [blank[:] for _ in range(-n)] + region[:len(region) + n]
+        for row, new in zip(rows, region):
+            row[self.left:self.right + 1] = new
+
+    def _control(self, ch):
+        self._wrap_pending = False
+        if ch == '\n':
+            if self.newline_cr:
+                self.x = self.left
+            self._linefeed()
+        elif ch == '\r':
+            self.x = self.left
+        elif ch == '\b':
+            self.x = max(self.x - 1, 0)
+
+    def _escape(self, ch):
+        self._wrap_pending = False
+        if ch == 'D':
+            self._linefeed()
+        elif ch == 'E':
+            self.x = self.left
+            self._linefeed()
+        elif ch == 'M':
+            if self.y == self.top:
+                self._scroll(-1)
+            elif self.y > 0:
+                self.y -= 1
+        elif ch == '7':
+            self._saved = (self.x, self.y)
+        elif ch == '8':
+            self.x, self.y = self._saved
+        elif ch == 'c':
+            self.reset()
+
+    def _csi(self, private, params, final):  # pylint:disable=R0912
+        args = [int(p) if p else 0 for p in params.split(';')] if params else []
+        n = max(args[0], 1) if args else 1
+        self._wrap_pending = False
+        if private:
+            on = final == 'h'
+            for arg in args:
+                if arg == 25:
+                    self.cursor_visible = on
+                elif arg == 69:
+                    self._margins_mode = on
+                    if not on:
+                        self.left, self.right = 0, self.width - 1
+        elif final in 'Hf':
+            row = args[0] if args and args[0] else 1
+            col = args[1] if len(args) > 1 and args[1] else 1
+            self.y = min(row, self.height) - 1
+            self.x = min(col, self.width) - 1
+        elif final == 'A':
+            self.y = max(self.y - n, 0)
+        elif final == 'B':
+            self.y = min(self.y + n, self.height - 1)
+        elif final == 'C':
+            self.x = min(self.x + n, self.width - 1)
+        elif final == 'D':
+            self.x = max(self.x - n, 0)
+        elif final == 'm':
+            self._sgr(args or [0])
+        elif final == 'K':
+            mode = args[0] if args else 0
+            x0 = 0 if mode else self.x
+            x1 = self.x + 1 if mode == 1 else self.width
+            self._erase(self.y, x0, x1)
+        elif final == 'J':
+            mode = args[0] if args else 0
+            if mode == 0:
+                self._erase(self.y, self.x, self.width)
+                rows = range(self.y + 1, self.height)
+            elif mode == 1:
+                self._erase(self.y, 0, self.x + 1)
+                rows = range(0, self.y)
+            else:
+                rows = range(self.height)
+            for y in rows:
+                self._erase(y, 0, self.width)
+        elif final == 'X':
+            self._erase(self.y, self.x, min(self.x + n, self.width))
+        elif final == 'b':
+            self._print(self._last * n)
+        elif final == 'S':
+            self._scroll(n)
+        elif final == 'T':
+            self._scroll(-n)
+        elif final == 'r':
+            top = args[0] if args and args[0] else 1
+            bottom = args[1] if len(args) > 1 and args[1] else self.height
+            self.top, self.bottom = top - 1, min(bottom, self.height) - 1
+            self.x = self.y = 0
+        elif final == 's' and self._margins_mode:
+            left = args[0] if args and args[0] else 1
+            right = args[1] if len(args) > 1 and args[1] else self.width
+            self.left, self.right = left - 1, min(right, self.width) - 1
+            self.x = self.y = 0
+        elif final == 's':
+            self._saved = (self.x, self.y)
+        elif final == 'u':
+            self.x, self.y = self._saved
+
+    def _sgr(self, args):
+        colors = Screen.colors
+        for arg in args:
+            if arg == 0:
+                self.fg = self.bg = None
+            elif 30 <= arg <= 37:
+                self.fg = colors[arg - 30]
+            elif arg == 39:
+                self.fg = None
+            elif 40 <= arg <= 47:
+                self.bg = colors[arg - 40]
+            elif arg == 49:
+                self.bg = None
@@ -36,5 +36,5 @@ setup(
     author_email='bjorn@tkbe.org',
     url='https://github.com/thebjorn/doscmd-screen',
     download_url='https://github.com/thebjorn/doscmd-screen',
-    py_modules=['screen']
+    py_modules=['screen', 'aioscreen', 'shmscreen']
 )
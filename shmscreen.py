@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+"""Provides :class:`SharedScreen`, a screen buffer in shared memory that
+   worker processes draw on directly (Python 3.8+ only).
+
+   Usage::
+
+       # parent process
+       scr = Screen(buffered=True)
+       shared = SharedScreen.create(scr.width, scr.height,
+                                    regions=[(0, 0, 40, 20), (40, 0, 40, 20)])
+       # ..start the workers, passing them `shared` and a region index
+       while running:
+           shared.present(scr)
+           time.sleep(1 / 30)
+       shared.close()
+       shared.unlink()
+
+       # worker process
+       with shared:
+           w = shared.window(index)
+           w.write('hello')
+
+   Each region has a generation counter that is incremented by every write
+   to it.  The presenter only copies the regions whose counter changed into
+   the screen's back buffer, so writing costs no serialization or IPC.
+   Each region should have a single writer.
+"""
+from array import array
+
+from screen import Window, _CellGrid, _Surface, _SGR_CODES, _UTF32
+
+
+def _pack(fg, bg):
+    return (fg or 0) << 8 | (bg or 0)
+
+
+class _SharedGrid(object):
+    """The grid interface of a buffered :class:`screen.Screen` (see
+       :class:`screen._CellGrid`) for one region of a :class:`SharedScreen`.
+       Coordinates are relative to the region.
+    """
+    def __init__(self, shared, index):
+        self.shared = shared
+        self.index = index
+        self.x, self.y, self.width, self.height = shared.regions[index]
+
+    def _bump(self):
+        self.shared._counters[self.index] += 1
+
+    def _offset(self, x, y):
+        return (self.y + y) * self.shared.width + self.x + x
+
+    def put(self, x, y, txt, fg='', bg=''):
+        """Write `txt` at x, y, clipped to the region.
+        """
+        if not 0 <= y < self.height or x >= self.width:
+            return
+        if x < 0:
+            txt = txt[-x:]
+            x = 0
+        txt = txt[:self.width - x]
+        start = self._offset(x, y)
+        end = start + len(txt)
+        self.shared._chars[start:end] = array('I', txt.encode(_UTF32))
+        self.shared._attrs[start:end] = array('H', [_pack(fg, bg)]) * len(txt)
+        self._bump()
+
+    def fill(self, x, y, width, height, cell=_CellGrid.blank):
+        """Set all cells in the rectangle to `cell`.
+        """
+        x0, x1 = max(x, 0), min(x + width, self.width)
+        if x0 >= x1:
+            return
+        char, fg, bg = cell
+        chars = array('I', [ord(char)]) * (x1 - x0)
+        attrs = array('H', [_pack(fg, bg)]) * (x1 - x0)
+        for row in range(max(y, 0), min(y + height, self.height)):
+            start = self._offset(x0, row)
+            self.shared._chars[start:start + len(chars)] = chars
+            self.shared._attrs[start:start + len(attrs)] = attrs
+        self._bump()
+
+    def cells(self, y, x0, x1):
+        """The cells x0..x1 of row `y`.
+        """
+        return self.shared.cells(self.x + x0, self.y + y, x1 - x0)
+
+    def scroll(self, x, y, width, height, n=1):
+        """Scroll the rectangle up `n` lines, clearing the exposed lines.
+        """
+        x0, x1 = max(x, 0), min(x + width, self.width)
+        y0, y1 = max(y, 0), min(y + height, self.height)
+        chars, attrs = self.shared._chars, self.shared._attrs
+        for row in range(y0, y1 - n):
+            dst, src = self._offset(x0, row), self._offset(x0, row + n)
+            chars[dst:dst + x1 - x0] = chars[src:src + x1 - x0]
+            attrs[dst:dst + x1 - x0] = attrs[src:src + x1 - x0]
+        top = max(y1 - n, y0)
+        self.fill(x0, top, x1 - x0, y1 - top)
+
+
+class SharedScreen(object):
+    """A `width` x `height` cell buffer in shared memory, divided into
+       `regions` (a list of (x, y, width, height) rectangles), one for each
+       writer.
+
+       Create it with :meth:`create` in the parent process, and pass it
+       to the worker processes (it is pickled by name, the workers attach
+       to the same memory).
+    """
+    def __init__(self, shm, width, height, regions, owner=False):
+        self._shm = shm
+        self.width = width
+        self.height = height
+        self.regions = [tuple(r) for r in regions]
+        self.owner = owner
+        nregions = len(self.regions)
+        buf = shm.buf
+        ncells = width * height
+        self._counters = buf[:8 * nregions].cast('Q')
+        start = 8 * nregions
+        self._chars = buf[start:start + 4 * ncells].cast('I')
+        start += 4 * ncells
+        self._attrs = buf[start:start + 2 * ncells].cast('H')
+        self._seen = [None] * nregions
+        self._closed = False
+
+    @staticmethod
+    def _size(width, height, nregions):
+        return 8 * nregions + 6 * width * height
+
+    @classmethod
+    def create(cls, width, height, regions):
+        """Allocate a new (blank) shared screen.
+        """
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(
+            create=True, size=cls._size(width, height, len(regions))
+        )
+        res = cls(shm, width, height, regions, owner=True)
+        res._chars[:] = array('I', [ord(' ')]) * (width * height)
+        res._attrs[:] = array('H', [0]) * (width * height)
+        return res
+
+    @property
+    def name(self):
+        """The name of the shared memory block.
+        """
+        return self._shm.name
+
+    def __getstate__(self):
+        return dict(name=self.name, width=self.width, height=self.height,
+                    regions=self.regions)
+
+    def __setstate__(self, state):
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(state['name'], track=False)
+        except TypeError:
+            # python < 3.13 registers the block with the resource tracker,
+            # which child processes share with the parent, so it isn't
+            # freed until the parent unlinks it.
+            shm = shared_memory.SharedMemory(state['name'])
+        self.__init__(shm, state['width'], state['height'], state['regions'])
+
+    def generation(self, index):
+        """The number of writes made to region `index`.
+        """
+        return self._counters[index]
+
+    def screen(self, index, **kw):
+        """Return a buffered :class:`screen.Screen` that draws on region
+           `index` (keyword arguments, e.g. colors, are passed on).
+        """
+        width, height = self.regions[index][2:]
+        scr = _Surface(width, height, **kw)
+        scr._back = _SharedGrid(self, index)
+        scr._front = None
+        return scr
+
+    def window(self, index, **kw):
+        """Return a :class:`screen.Window` that covers region `index`.
+        """
+        scr = self.screen(index)
+        return Window(scr, 0, 0, scr.width, scr.height, **kw)
+
+    def cells(self, x, y, n):
+        """The `n` cells starting at x, y, as (char, fg, bg) tuples.
+        """
+        start = y * self.width + x
+        text = self._chars[start:start + n].tobytes().decode(_UTF32)
+        attrs = self._attrs[start:start + n].tolist()
+        code = _SGR_CODES.__getitem__
+        return list(zip(
+            text,
+            map(code, [a >> 8 for a in attrs]),
+            map(code, [a & 0xff for a in attrs]),
+        ))
+
+    def present(self, screen):
+        """Copy the regions that changed since the last call into the back
+           buffer of `screen` (which must be buffered), and present it.
+           Returns the number of regions that were copied.
+        """
+        if not screen.buffered:
+            raise ValueError("SharedScreen.present needs a buffered screen")
+        screen.check_resize()
+        back = screen._back
+        copied = 0
+        for i, (x, y, width, height) in enumerate(self.regions):
+            gen = self._counters[i]
+            if gen == self._seen[i]:
+                continue
+            # writes after this point bump the counter again
+            self._seen[i] = gen
+            copied += 1
+            x0, x1 = max(x, 0), min(x + width, self.width, back.width)
+            if x0 >= x1:
+                continue
+            for row in range(max(y, 0), min(y + height, self.height, back.height)):
+                back.put_cells(x0, row, self.cells(x0, row, x1 - x0))
+        screen.present()
+        return copied
+
+    def close(self):
+        """Detach from the shared memory (the windows and screens of this
+           shared screen can't be used after this).
+        """
+        if self._shm is not None and not self._closed:
+            self._closed = True
+            for view in (self._counters, self._chars, self._attrs):
+                view.release()
+            self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        # the views must be released before the SharedMemory is collected
+        self.close()
+
+    def unlink(self):
+        """Free the shared memory (call once, from the process that created
+           it, after :meth:`close`).
+        """
+        self._shm.unlink()
+        self._shm = None
@@ -143,10 +143,21 @@ def watch(ctx):
     watcher.start()
 
 
+@task
+def bench(ctx, output='bench_screen.json', sink='all', scale=1.0):
+    """Run the output benchmarks, and save the results as json (in the
+       current directory, unless `output` is an absolute path).
+    """
+    ctx.run('python {script} --json {output} --sink {sink} --scale {scale}'.format(
+        script=DIRNAME / 'bench_screen.py', output=output, sink=sink, scale=scale
+    ))
+
+
 # individual tasks that can be run from this project
 ns = Collection(
     build,
     watch,
+    bench,
     build_js,
     lessc,
     doctools,
@@ -0,0 +1,613 @@
+# -*- coding: utf-8 -*-
+"""Tests that check the screen contents produced by :mod:`screen`, using
+   a :class:`screen.VirtualTerminal`.  Run with ``python -m pytest``.
+"""
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+from screen import (
+    Screen, ScreenInfo, ScreenStats, Window, Renderer, WindowProxy,
+    Compositor, FdOutput, VirtualTerminal,
+)
+
+W, H = 40, 12
+
+
+def new_screen(width=W, height=H, **kw):
+    vt = VirtualTerminal(width, height)
+    return Screen(ScreenInfo.fixed(width, height), stream=vt, **kw), vt
+
+
+def window_lines(vt, w):
+    return [vt.line(w.y + i)[w.x:w.x + w.width].rstrip() for i in range(w.height)]
+
+
+def resize(info, columns, lines):
+    """Make `info` look like the terminal was resized.
+    """
+    info.width = info.right = info.maxx = columns - 1
+    info.height = info.bottom = info.maxy = lines - 1
+    info.generation += 1
+
+
+# writexy / fill / cls
+
+def test_writexy():
+    scr, vt = new_screen()
+    scr.writexy(2, 1, 'hello', fg='red', bg='blue')
+    scr.writexy(0, 3, 'world')
+    assert vt.line(1) == '  hello'
+    assert vt.cell(2, 1).fg == 'red'
+    assert vt.cell(2, 1).bg == 'blue'
+    assert vt.line(3) == 'world'
+    assert vt.cell(0, 3).fg is None
+
+
+def test_writexy_after_newline():
+    scr, vt = new_screen()
+    scr.writexy(0, 0, 'ab\ncd')
+    scr.writexy(3, 0, 'X')
+    assert vt.text()[:2] == ['ab X', 'cd']
+
+
+def test_writexy_after_scroll_window():
+    scr, vt = new_screen()
+    scr.writexy(0, 3, 'a')
+    scr.scroll_window_up()
+    scr.writexy(2, 3, 'b')
+    assert vt.line(3) == 'a b'
+    scr.scroll_window_down()
+    scr.writexy(4, 3, 'c')
+    assert vt.line(3) == 'a b c'
+
+
+def test_colors_are_reset_after_unframed_writes():
+    scr, vt = new_screen(fg='white', bg='black')
+    scr.writexy(0, 0, 'abc')
+    assert vt.cell(0, 0).fg == 'white'
+    assert (vt.fg, vt.bg) == (None, None)
+    scr.fill(0, 1, 3, 1, bg='blue')
+    assert vt.cell(0, 1).bg == 'blue'
+    assert (vt.fg, vt.bg) == (None, None)
+
+
+def test_frame_colors_are_set_once():
+    scr, vt = new_screen(fg='white', bg='black')
+    with scr.frame():
+        for y in range(5):
+            scr.writexy(0, y, 'abc')
+    assert vt.writes == 1
+    assert vt.bytes < 5 * len('\x1b[37;40mabc\x1b[0m')
+    assert vt.cell(0, 4).fg == 'white'
+    assert (vt.fg, vt.bg) == (None, None)
+
+
+def test_fill_and_cls():
+    scr, vt = new_screen()
+    scr.writelinesxy(0, 0, '\n'.join('x' * W for _ in range(H)))
+    scr.fill(5, 2, 10, 3, char='.', bg='green')
+    assert vt.line(2) == 'x' * 5 + '.' * 10 + 'x' * (W - 15)
+    assert vt.cell(5, 4).bg == 'green'
+    assert vt.line(5) == 'x' * W
+    scr.fill(0, 0, 3, 1)
+    assert vt.line(0).startswith('   x')
+    scr.cls()
+    assert vt.text() == [''] * H
+
+
+def test_frame_is_one_write():
+    scr, vt = new_screen()
+    with scr.frame():
+        for y in range(H):
+            scr.writexy(0, y, 'row %d' % y, fg='green')
+    assert vt.writes == 1
+    assert vt.line(H - 1) == 'row %d' % (H - 1)
+
+
+def test_writemany():
+    scr, vt = new_screen()
+    scr.writemany([(10, 1, 'b', 'red', None), (0, 1, 'a'), (1, 1, 'c')])
+    assert vt.line(1) == 'ac        b'
+    assert vt.cell(10, 1).fg == 'red'
+    assert vt.writes == 1
+
+
+# statistics
+
+def test_stats():
+    frames = []
+    stats = ScreenStats(on_frame=lambda stats, frame: frames.append(frame))
+    scr, vt = new_screen(stats=stats)
+    scr.writexy(0, 0, 'abc', fg='red')
+    nbytes = vt.bytes
+    with scr.frame():
+        scr.writexy(0, 1, 'def')
+        scr.writexy(0, 2, 'ghi')
+    assert (stats.bytes, stats.writes) == (vt.bytes, vt.writes)
+    assert stats.frames == 1
+    assert len(frames) == 1
+    assert frames[0]['bytes'] == vt.bytes - nbytes
+    assert frames[0]['writes'] == 1
+    # set red and reset; one absolute move, then down + return
+    assert stats.escapes == {'SGR': 2, 'CUP': 1, 'CUD': 2, 'CR': 2}
+    assert set(stats.time) == {'writexy'}
+
+    w = Window(scr, 0, 4, 20, 3)
+    w.write('hello')
+    assert 'write' in stats.time
+    assert 'waited' in stats.summary()
+    stats.reset()
+    assert stats.bytes == stats.writes == 0
+
+
+@pytest.mark.parametrize('stats', [None, False])
+def test_no_stats(stats):
+    scr, vt = new_screen(stats=stats)
+    w = Window(scr, 0, 0, 20, 3)
+    assert scr.stats is None
+    # no timing wrappers
+    assert 'writexy' not in vars(scr)
+    assert 'write' not in vars(w)
+    w.write('hello')
+    assert vt.line(0) == 'hello'
+
+
+# buffered output gives the same result as direct output
+
+def draw(scr):
+    scr.cls()
+    scr.fill(0, 0, W, 2, char='=', bg='blue')
+    for y in range(2, H):
+        scr.writexy(y, y, 'line %d' % y, fg=Screen.colors[y % 8])
+    scr.writemany([(0, H - 1, 'a', 'red', None), (1, H - 1, 'b')])
+
+
+def grid(vt):
+    return [[vt.cell(x, y) for x in range(vt.width)] for y in range(vt.height)]
+
+
+@pytest.mark.parametrize('grid_type', [None, 'numpy'])
+def test_present_matches_direct_output(grid_type):
+    if grid_type == 'numpy':
+        pytest.importorskip('numpy')
+    direct, vt1 = new_screen()
+    draw(direct)
+    buffered, vt2 = new_screen(buffered=True, grid=grid_type)
+    draw(buffered)
+    assert vt2.writes == 0
+    buffered.present()
+    assert grid(vt2) == grid(vt1)
+
+    # only changes are sent the second time
+    nbytes = vt2.bytes
+    buffered.writexy(3, 3, 'X')
+    buffered.present()
+    assert vt2.bytes - nbytes < 20
+    assert vt2.line(3)[3] == 'X'
+
+
+# windows
+
+@pytest.mark.parametrize('kw,x,width', [
+    ({}, 0, W),                         # full width: scroll regions
+    ({'margins': True}, 5, 20),         # left/right margins
+    ({}, 5, 20),                        # repaint fallback
+    ({'scroll_regions': False}, 0, W),  # repaint fallback
+    ({'buffered': True}, 5, 20),        # back buffer scroll
+])
+def test_window_wrap_and_scroll(kw, x, width):
+    scr, vt = new_screen(**kw)
+    w = Window(scr, x, 2, width, 6, scrollback=20)
+    w.write('a' * (width + 3))
+    w.write('\n')
+    assert w.content[:2] == ['a' * width, 'aaa']
+    for i in range(20):
+        w.write('line %d' % i)
+        w.write('\n')
+    scr.present()
+    assert window_lines(vt, w) == w.content
+    assert 'line 19' in w.content
+    assert w.history > 0
+
+
+def test_window_scroll_view():
+    scr, vt = new_screen()
+    w = Window(scr, 0, 0, W, 4, scrollback=20)
+    w.write('\n'.join('line %d' % i for i in range(10)))
+    w.scroll_view(3)
+    assert window_lines(vt, w) == w._view()
+    assert 'line 9' not in window_lines(vt, w)
+    w.scroll_view(0)
+    assert window_lines(vt, w) == w.content
+
+
+@pytest.mark.parametrize('deferred', [False, True])
+def test_window_scroll_view_with_full_history(deferred):
+    scr, vt = new_screen()
+    w = Window(scr, 0, 0, 20, 2, scrollback=2, deferred=deferred)
+    w.write('LONG LINE 1\nLONG LINE 2\nc\nd')
+    w.render()
+    w.scroll_view(2)
+    w.render()
+    assert window_lines(vt, w) == ['LONG LINE 1', 'LONG LINE 2']
+    w.write('\ne\nd')  # pushes the lines shown out of the history
+    w.scroll_view(2)
+    w.render()
+    assert window_lines(vt, w) == w._view()
+    w.scroll_view(0)
+    w.render()
+    assert window_lines(vt, w) == w.content == ['e', 'd']
+
+
+def test_deferred_window():
+    scr, vt = new_screen()
+    w = Window(scr, 5, 2, 20, 5, deferred=True)
+    for i in range(30):
+        w.write('line %d' % i)
+        w.write('\n')
+    assert vt.text() == [''] * H
+    w.render()
+    assert window_lines(vt, w) == w.content
+    nbytes = vt.bytes
+    w.render()
+    assert vt.bytes == nbytes
+
+
+def test_renderer_renders_queued_writes():
+    scr, vt = new_screen()
+    r = Renderer(scr)
+    windows = [r.window(i * 20, 0, 19, 6) for i in range(2)]
+    for i in range(50):
+        windows[0].write('busy %d' % i)
+        windows[0].write('\n')
+    windows[1].write('idle')
+    assert r.queue_depth == 101
+    r.render()
+    assert r.queue_depth == 0
+    assert vt.writes == 1
+    for w in windows:
+        assert window_lines(vt, w) == w.content
+    nbytes = vt.bytes
+    r.render()
+    assert vt.bytes == nbytes
+
+
+class Inbox(list):
+    """Stands in for the renderer's multiprocessing queue.
+    """
+    def put(self, item):
+        self.append(item)
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_window_proxy_batches_in_order():
+    inbox = Inbox()
+    proxy = WindowProxy(inbox, 3, 20, 5, batch=10)
+
+    def writer(name):
+        for n in range(200):
+            proxy.write('%s %d' % (name, n))
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    proxy.flush()
+    assert all(index == 3 for index, ops in inbox)
+    texts = [op[1] for index, ops in inbox for op in ops]
+    assert len(texts) == 800
+    for i in range(4):
+        mine = [t for t in texts if t.startswith('%d ' % i)]
+        assert mine == ['%d %d' % (i, n) for n in range(200)]
+
+
+def test_window_proxy_flusher():
+    inbox = Inbox()
+    proxy = WindowProxy(inbox, 0, 20, 5, interval=0.01)
+    proxy.write('hello')
+    assert wait_for(lambda: inbox)
+    assert inbox == [(0, [('_write_text', 'hello')])]
+    # the thread exits when there is nothing left to send
+    assert wait_for(lambda: proxy._flusher is None)
+    proxy.newline()
+    assert wait_for(lambda: len(inbox) == 2)
+
+    copy = pickle.loads(pickle.dumps(proxy))
+    with copy:
+        copy.writexy(1, 1, 'x')
+    assert copy._inbox[-1] == (0, [('_writexy', 1, 1, 'x')])
+
+
+def test_renderer_proxy():
+    scr, vt = new_screen()
+    r = Renderer(scr)
+    w = r.window(0, 0, 20, 4)
+    with r.proxy(w) as proxy:
+        proxy.write('from a proxy')
+    assert wait_for(lambda: r.render() or w.content[0])
+    assert window_lines(vt, w)[0] == 'from a proxy'
+
+
+# resizing
+
+def fake_terminal(info, sizes):
+    """Make `info` follow a terminal whose size is the last of `sizes`.
+    """
+    def probe():
+        columns, lines = sizes[-1]
+        info.width = info.right = info.maxx = columns - 1
+        info.height = info.bottom = info.maxy = lines - 1
+    info._probe = probe
+    info._watched = True
+
+
+def test_poll_after_sigwinch():
+    import signal
+    if not hasattr(signal, 'SIGWINCH'):
+        pytest.skip('no SIGWINCH')
+    info = ScreenInfo.fixed(W, H)
+    sizes = [(W, H)]
+    fake_terminal(info, sizes)
+    calls = []
+    info.on_resize(calls.append)
+    previous = signal.getsignal(signal.SIGWINCH)
+    try:
+        info._watch()
+        assert info._signals
+        sizes.append((W + 10, H))
+        assert not info.poll()  # no signal yet
+        os.kill(os.getpid(), signal.SIGWINCH)
+        assert info.poll()
+        assert (info.generation, info.width) == (1, W + 9)
+        assert calls == [info]
+        os.kill(os.getpid(), signal.SIGWINCH)
+        assert not info.poll()  # same size
+        assert info.generation == 1
+    finally:
+        signal.signal(signal.SIGWINCH, previous)
+
+
+def test_poll_without_signals():
+    info = ScreenInfo.fixed(W, H)
+    info.poll_interval = 1000
+    sizes = [(W, H)]
+    fake_terminal(info, sizes)
+    assert not info.poll()
+    sizes.append((W, H + 5))
+    assert not info.poll()  # polled less than poll_interval ago
+    info._next_poll = 0
+    assert info.poll()
+    assert (info.generation, info.height) == (1, H + 4)
+
+
+def test_check_resize():
+    scr, vt = new_screen(buffered=True)
+    calls = []
+    scr.on_resize(calls.append)
+    assert not scr.check_resize()
+    resize(scr._info, W + 10, H + 2)
+    assert scr.check_resize()
+    assert calls == [scr]
+    assert (scr.width, scr.height) == (W + 10, H + 2)
+    assert not scr.check_resize()
+
+
+def test_screen_info_without_generation():
+    class Info(object):
+        width = right = maxx = W - 1
+        height = bottom = maxy = H - 1
+        x = y = left = top = xpos = ypos = 0
+
+    vt = VirtualTerminal(W, H)
+    scr = Screen(Info(), stream=vt)
+    assert not scr.check_resize()
+    scr.writexy(0, 0, 'hello')
+    assert vt.line(0) == 'hello'
+
+
+def test_layout_resize():
+    scr, vt = new_screen(80, 24)
+    vt.width, vt.height = 100, 30
+    vt.reset()
+    rows = scr.windows(2, 1)
+    left, right = rows[0]
+    left.write('x' * 60)
+    right.write('hello')
+    resize(scr._info, 100, 30)
+    scr.check_resize()
+    assert (left.width, left.height) == (49, 29)
+    assert (right.x, right.width) == (50, 49)
+    assert left.content[:2] == ['x' * 49, 'x' * 11]
+    assert window_lines(vt, left)[:2] == ['x' * 49, 'x' * 11]
+    assert window_lines(vt, right)[0] == 'hello'
+
+
+def test_windows_replaces_layout():
+    scr, vt = new_screen(80, 24)
+    old = scr.windows(2, 1)[0][0]
+    layout = scr.layout
+    scr.windows(3, 2)
+    assert layout._on_resize not in scr._resize_callbacks
+    assert len(scr._resize_callbacks) == 1
+    resize(scr._info, 100, 30)
+    scr.check_resize()
+    assert (old.width, old.height) == (39, 23)  # not re-fitted
+    assert scr.layout.rows[0][0].width == 32
+    scr.layout.close()
+    assert scr._resize_callbacks == []
+
+
+def test_compositor_popup():
+    scr, vt = new_screen(buffered=True)
+    comp = Compositor(scr)
+    log = comp.window(0, 0, W, H)
+    log.write('\n'.join('log line %d' % i for i in range(H)))
+    comp.present()
+    before = vt.text()
+    popup = comp.window(10, 3, 20, 3)
+    with popup.frame():
+        popup.write('Are you sure?')
+    comp.present()
+    assert vt.line(3)[10:23] == 'Are you sure?'
+    comp.remove(popup)
+    comp.present()
+    assert vt.text() == before
+
+
+# shared memory
+
+def test_shared_screen():
+    pytest.importorskip('multiprocessing.shared_memory')
+    from shmscreen import SharedScreen
+    scr, vt = new_screen(buffered=True)
+    shared = SharedScreen.create(W, H, regions=[(0, 0, 20, H), (20, 0, 20, H)])
+    try:
+        # a worker attaches to the same memory by name
+        worker = pickle.loads(pickle.dumps(shared))
+        with worker:
+            w = worker.window(1)
+            w.write('\n'.join('line %d' % i for i in range(H + 3)))
+            worker.screen(0).writexy(1, 1, 'left', fg='red')
+            gen = shared.generation(1)
+            assert gen > 0
+        assert shared.present(scr) == 2
+        assert [vt.line(y)[20:].rstrip() for y in range(H)] == w.content
+        assert vt.line(1).startswith(' left')
+        assert vt.cell(1, 1).fg == 'red'
+        assert shared.present(scr) == 0  # nothing changed
+        assert shared.generation(1) == gen
+    finally:
+        shared.close()
+        shared.unlink()
+    shared.close()  # closing twice is fine
+
+
+# writing to file descriptors
+
+def short_writes(monkeypatch, maxlen):
+    """Make os.write and os.writev write at most `maxlen` bytes per call,
+       and fail with EINTR and EAGAIN first.  Returns the list of calls.
+    """
+    import errno
+    write = os.write
+    calls = []
+    errors = [errno.EINTR, errno.EAGAIN]
+
+    def fake_write(fd, data):
+        calls.append(bytes(data))
+        if errors:
+            raise OSError(errors.pop(0), 'fake')
+        return write(fd, bytes(data)[:maxlen])
+
+    monkeypatch.setattr(os, 'write', fake_write)
+    if hasattr(os, 'writev'):
+        monkeypatch.setattr(
+            os, 'writev', lambda fd, chunks: fake_write(fd, b''.join(chunks))
+        )
+    return calls
+
+
+def read_pipe(r):
+    with os.fdopen(r, 'rb') as fp:
+        return fp.read()
+
+
+def test_fd_output_partial_writes(monkeypatch):
+    r, w = os.pipe()
+    out = FdOutput(w)
+    calls = short_writes(monkeypatch, 3)
+    out.write(u'h\xe9llo world')
+    out.writelines([b'ab', u'\xe9', b'', b'defgh', b'i'])
+    os.close(w)
+    assert read_pipe(r) == u'h\xe9llo worldab\xe9defghi'.encode('utf-8')
+    assert calls[:3] == [u'h\xe9llo world'.encode('utf-8')] * 3
+
+
+def test_fd_output_screen():
+    r, w = os.pipe()
+    scr = Screen(ScreenInfo.fixed(W, H), stream=FdOutput(w))
+    with scr.frame():
+        scr.writexy(0, 0, 'hello', fg='red')
+        scr.writexy(2, 3, u'w\xf6rld')
+    os.close(w)
+    vt = VirtualTerminal(W, H)
+    vt.write(read_pipe(r).decode('utf-8'))
+    assert vt.line(0) == 'hello'
+    assert vt.cell(0, 0).fg == 'red'
+    assert vt.line(3) == u'  w\xf6rld'
+
+
+# following files
+
+def test_follower(tmpdir):
+    path = str(tmpdir.join('log'))
+    with open(path, 'w') as fp:
+        fp.write(''.join('line %d\n' % i for i in range(1000)))
+    scr, vt = new_screen()
+    w = Window(scr, 0, 0, 30, 4)
+    follower = w.follow(path)
+    assert w.content == ['line 996', 'line 997', 'line 998', 'line 999']
+
+    with open(path, 'a') as fp:
+        fp.write('new\npart')
+    follower.poll()
+    with open(path, 'a') as fp:
+        fp.write('ial\n')
+    follower.poll()
+    assert [line for line in w.content if line][-2:] == ['new', 'partial']
+
+    with open(path, 'w') as fp:  # truncated
+        fp.write('fresh\n')
+    follower.poll()
+    assert [line for line in w.content if line][-1] == 'fresh'
+
+    os.rename(path, path + '.1')  # rotated
+    with open(path + '.1', 'a') as fp:
+        fp.write('old tail\n')
+    with open(path, 'w') as fp:
+        fp.write('rotated\n')
+    follower.poll()
+    assert [line for line in w.content if line][-2:] == ['old tail', 'rotated']
+    assert window_lines(vt, w) == w.content
+    follower.close()
+
+
+# asyncio
+
+def test_async_screen(capsys):
+    import asyncio
+    from aioscreen import AsyncScreen, AsyncWindow
+    r, w = os.pipe()
+
+    async def main():
+        scr = await AsyncScreen.open(ScreenInfo.fixed(W, H), fd=w)
+        scr.writexy(0, 0, 'abc', fg='red')
+        win = AsyncWindow(scr, 0, 2, 10, 3)
+        win.write('hello')
+        await win.drain()
+        with scr.frame():
+            scr.writexy(0, 1, 'left', bg='blue')
+        await scr.aclose()
+        scr.writexy(0, 1, 'dropped')
+        scr.close()
+
+    asyncio.run(main())
+    vt = VirtualTerminal(W, H)
+    with os.fdopen(r, 'rb') as fp:
+        vt.write(fp.read().decode('utf-8'))
+    assert vt.text()[:3] == ['abc', 'left', 'hello']
+    assert vt.cell(0, 0).fg == 'red'
+    assert vt.cell(0, 1).bg == 'blue'
+    assert (vt.fg, vt.bg) == (None, None)
+    assert capsys.readouterr().out == ''